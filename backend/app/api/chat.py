@@ -1,4 +1,6 @@
-from fastapi import APIRouter, HTTPException
+import anyio
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from ..engine.intake_engine import engine
 from ..schemas import (
@@ -13,16 +15,33 @@ router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 @router.post("/start", response_model=StartSessionResponse)
 async def start_session():
-    session_id, greeting = engine.start_session()
+    session_id, greeting = await engine.start_session()
     return StartSessionResponse(session_id=session_id, message=greeting)
 
 
+async def _cancel_on_disconnect(
+    request: Request, scope: anyio.CancelScope
+) -> None:
+    while not await request.is_disconnected():
+        await anyio.sleep(0.5)
+    scope.cancel()
+
+
 @router.post("/message", response_model=ChatMessageResponse)
-async def send_message(req: ChatMessageRequest):
-    if req.session_id not in engine.sessions:
+async def send_message(req: ChatMessageRequest, request: Request):
+    if not await engine.session_exists(req.session_id):
         raise HTTPException(status_code=404, detail="Session not found")
 
-    result = await engine.process_message(req.session_id, req.message)
+    # Abort the LLM call if the caller goes away mid-turn
+    result = None
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(_cancel_on_disconnect, request, tg.cancel_scope)
+        result = await engine.process_message(req.session_id, req.message)
+        tg.cancel_scope.cancel()
+
+    if result is None:
+        return Response(status_code=499)
+
     return ChatMessageResponse(
         message=result["message"],
         case_type=result.get("case_type"),
@@ -30,10 +49,23 @@ async def send_message(req: ChatMessageRequest):
     )
 
 
+@router.post("/message/stream")
+async def stream_message(req: ChatMessageRequest):
+    if not await engine.session_exists(req.session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    return StreamingResponse(
+        engine.process_message_stream(req.session_id, req.message),
+        media_type="text/event-stream",
+    )
+
+
 @router.post("/report")
 async def get_report(req: ReportRequest):
     report = await engine.get_report(req.session_id)
     if report is None:
+        if await engine.report_pending(req.session_id):
+            return JSONResponse(status_code=202, content={"status": "processing"})
         raise HTTPException(
             status_code=404,
             detail="No report available. Complete the intake first.",
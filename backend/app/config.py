@@ -4,9 +4,19 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     openai_api_key: str = ""
     openai_model: str = "gpt-4o-mini"
+    # Point at an OpenAI-compatible local runner (Ollama, vLLM, llama.cpp)
+    openai_base_url: str = ""
+    llm_cache_prompt: bool = False
+    openai_max_concurrency: int = 32
     firm_name: str = "Law Office"
     database_url: str = ""
     courtlistener_api_token: str = ""
+    redis_url: str = ""
+    session_ttl_seconds: int = 3600
+    report_batch_enabled: bool = False
+    report_batch_size: int = 32
+    report_batch_window_seconds: float = 30.0
+    report_batch_poll_seconds: float = 60.0
 
     model_config = {"env_file": ".env"}
 
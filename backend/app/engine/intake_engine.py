@@ -1,32 +1,83 @@
 from __future__ import annotations
 
-import uuid
-from dataclasses import dataclass, field
-from typing import Any
+import asyncio
+import logging
+import re
+import secrets
+from dataclasses import dataclass, field, fields, replace
+from typing import Any, AsyncIterator
+
+import orjson
 
 from ..config import settings
 from ..knowledge import CASE_KNOWLEDGE
 from ..knowledge.base import CaseTypeKnowledge
-from .llm import chat_json
-from .report_generator import generate_report
+from .llm import chat_json, chat_json_stream, chat_text
+from .report_batcher import REPORT_PENDING_TTL, ReportBatcher
+from .report_generator import build_report_request, finish_report, generate_report
+from .session_store import create_session_store
+
+logger = logging.getLogger(__name__)
+
+# Once history passes HISTORY_LIMIT messages, everything but the last
+# HISTORY_KEEP is folded into a single summary message.
+HISTORY_LIMIT = 16
+HISTORY_KEEP = 8
 
 
-@dataclass
+@dataclass(slots=True)
 class SessionState:
-    session_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    session_id: str = field(default_factory=lambda: secrets.token_urlsafe(16))
     state: str = "greeting"
     case_type: str | None = None
     case_type_confidence: float = 0.0
+    # Classifier's best guess while below the confidence threshold
+    case_type_guess: str | None = None
+    case_type_guess_confidence: float = 0.0
     gathered_facts: dict[str, Any] = field(default_factory=dict)
     conversation_history: list[dict] = field(default_factory=list)
+    # Report transcript lines, maintained alongside conversation_history
+    summary_lines: list[str] = field(default_factory=list)
     report: dict | None = None
+    _facts_json: str | None = field(default=None, repr=False)
+
+    def add_message(self, role: str, content: str) -> None:
+        self.conversation_history.append({"role": role, "content": content})
+        self.summary_lines.append(f"  {role.upper()}: {content[:300]}")
+
+    def set_fact(self, key: str, value: Any) -> None:
+        self.gathered_facts[key] = value
+        self._facts_json = None
+
+    def facts_json(self) -> str:
+        if self._facts_json is None:
+            self._facts_json = orjson.dumps(
+                self.gathered_facts, option=orjson.OPT_INDENT_2
+            ).decode()
+        return self._facts_json
+
+    def to_dict(self) -> dict:
+        return {f.name: getattr(self, f.name) for f in fields(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionState":
+        return cls(**data)
 
 
 class IntakeEngine:
     def __init__(self) -> None:
-        self.sessions: dict[str, SessionState] = {}
+        self._case_knowledge = CASE_KNOWLEDGE
+        self.store = create_session_store()
+        self.report_cache = create_session_store("report")
+        self.batch_store = create_session_store("report_batch")
+        self.report_batcher = ReportBatcher(
+            self._store_batched_report, self.batch_store
+        )
+
+    async def session_exists(self, session_id: str) -> bool:
+        return await self.store.exists(session_id)
 
-    def start_session(self) -> tuple[str, str]:
+    async def start_session(self) -> tuple[str, str]:
         session = SessionState()
         session.state = "intake"
 
@@ -37,53 +88,148 @@ class IntakeEngine:
             "What's going on?"
         )
 
-        session.conversation_history.append(
-            {"role": "assistant", "content": greeting}
-        )
-        self.sessions[session.session_id] = session
+        session.add_message("assistant", greeting)
+        await self._save(session)
         return session.session_id, greeting
 
     async def process_message(
         self, session_id: str, user_message: str
     ) -> dict:
-        session = self.sessions.get(session_id)
-        if session is None:
-            return {"message": "Session not found. Please start a new conversation.", "ready_for_report": False}
+        # Held for the whole turn so a double submit or a batched report
+        # landing mid-turn isn't overwritten by this turn's save.
+        async with self.store.lock(session_id):
+            session = await self._load(session_id)
+            if session is None:
+                return {"message": "Session not found. Please start a new conversation.", "ready_for_report": False}
+
+            session.add_message("user", user_message)
+            self._classify_locally(session, user_message)
+            result = await self._dispatch(session)
+            await self._save(session)
+            return result
+
+    async def process_message_stream(
+        self, session_id: str, user_message: str
+    ) -> AsyncIterator[str]:
+        """Server-Sent Events for one turn.
+
+        Emits "delta" events while the assistant reply streams in, then one
+        "done" event with the same payload process_message() returns, or an
+        "error" event if the turn fails (the session is left unchanged).
+        """
+        async with self.store.lock(session_id):
+            session = await self._load(session_id)
+            if session is None:
+                yield _sse("done", {"message": "Session not found. Please start a new conversation.", "ready_for_report": False})
+                return
+
+            session.add_message("user", user_message)
+            self._classify_locally(session, user_message)
+
+            try:
+                if session.state != "intake" or self._should_speculate(session):
+                    result = await self._dispatch(session)
+                else:
+                    llm_result: dict = {}
+                    async for kind, payload in chat_json_stream(
+                        self._build_prompt(session), session.conversation_history
+                    ):
+                        if kind == "delta":
+                            yield _sse("delta", {"text": payload})
+                        else:
+                            llm_result = payload
+                    result = await self._apply_intake_result(session, llm_result)
+            except Exception:
+                # Headers are already sent, so the failure has to travel in-band
+                logger.exception("Streaming turn failed for %s", session_id)
+                yield _sse("error", {"message": "Sorry, something went wrong. Please try again."})
+                return
+
+            await self._save(session)
+        yield _sse("done", result)
 
-        session.conversation_history.append(
-            {"role": "user", "content": user_message}
-        )
+    async def get_report(self, session_id: str) -> dict | None:
+        session = await self._load(session_id)
+        if session is None or session.report is None:
+            return None
+        return session.report
 
-        if session.state == "complete":
+    async def report_pending(self, session_id: str) -> bool:
+        session = await self._load(session_id)
+        return session is not None and session.state == "report_pending"
+
+    # ------------------------------------------------------------------
+    # Internal
+    # ------------------------------------------------------------------
+
+    async def _load(self, session_id: str) -> SessionState | None:
+        data = await self.store.get(session_id)
+        if data is None:
+            return None
+        return SessionState.from_dict(data)
+
+    async def _save(self, session: SessionState) -> None:
+        ttl = REPORT_PENDING_TTL if session.state == "report_pending" else None
+        await self.store.set(session.session_id, session.to_dict(), ttl)
+
+    async def _dispatch(self, session: SessionState) -> dict:
+        if session.state in ("complete", "report_pending"):
             return {
                 "message": "You're all set — an attorney will be in touch soon.",
                 "case_type": session.case_type,
                 "ready_for_report": True,
             }
-
         if session.state == "generating_report":
             return await self._finalize(session)
-
         return await self._handle_intake(session)
 
-    async def get_report(self, session_id: str) -> dict | None:
-        session = self.sessions.get(session_id)
-        if session is None or session.report is None:
-            return None
-        return session.report
-
-    # ------------------------------------------------------------------
-    # Internal
-    # ------------------------------------------------------------------
+    def _classify_locally(self, session: SessionState, user_message: str) -> None:
+        """Set the case type from keywords alone when the match is unambiguous.
+
+        Saves the classification round trip: the turn goes straight to the
+        fact-gathering prompt. Anything ambiguous is left to the LLM.
+        """
+        if session.state != "intake" or session.case_type is not None:
+            return
+
+        hits: dict[str, set[str]] = {}
+        for match in _KEYWORD_RE.finditer(user_message.lower()):
+            keyword = match.group(0)
+            hits.setdefault(_KEYWORD_CASE_TYPES[keyword], set()).add(keyword)
+
+        if len(hits) != 1:
+            return
+        [(case_type, keywords)] = hits.items()
+        # Weak keywords alone ("pulled over", "officer") fit too many other
+        # stories; case_type is never revisited once set, so only a strong
+        # keyword locks it in.
+        strong = self._case_knowledge[case_type].strong_keywords
+        if any(k in strong for k in keywords):
+            session.case_type = case_type
+            session.case_type_confidence = 0.95
+
+    def _should_speculate(self, session: SessionState) -> bool:
+        return (
+            session.case_type is None
+            and session.case_type_guess in self._case_knowledge
+            and session.case_type_guess_confidence > 0.5
+        )
 
     async def _handle_intake(self, session: SessionState) -> dict:
-        prompt = self._build_prompt(session)
-        result = await chat_json(prompt, session.conversation_history)
-
+        if self._should_speculate(session):
+            result = await self._speculative_intake(session)
+        else:
+            prompt = self._build_prompt(session)
+            result = await chat_json(prompt, session.conversation_history)
+        return await self._apply_intake_result(session, result)
+
+    async def _apply_intake_result(
+        self, session: SessionState, result: dict
+    ) -> dict:
         if result.get("extracted_facts"):
             for k, v in result["extracted_facts"].items():
                 if v is not None:
-                    session.gathered_facts[k] = v
+                    session.set_fact(k, v)
 
         if (
             result.get("case_type")
@@ -91,14 +237,16 @@ class IntakeEngine:
         ):
             session.case_type = result["case_type"]
             session.case_type_confidence = result["case_type_confidence"]
+        elif session.case_type is None:
+            session.case_type_guess = result.get("case_type")
+            session.case_type_guess_confidence = result.get("case_type_confidence", 0)
 
         response_text = result.get(
             "response",
             "Could you tell me a bit more about what happened?",
         )
-        session.conversation_history.append(
-            {"role": "assistant", "content": response_text}
-        )
+        session.add_message("assistant", response_text)
+        await self._compact_history(session)
 
         if result.get("ready_for_report"):
             session.state = "generating_report"
@@ -110,6 +258,99 @@ class IntakeEngine:
             "ready_for_report": False,
         }
 
+    async def _compact_history(self, session: SessionState) -> None:
+        """Keep the prompt bounded by summarizing older turns.
+
+        The report transcript (summary_lines) is unaffected.
+        """
+        history = session.conversation_history
+        if len(history) <= HISTORY_LIMIT:
+            return
+
+        older = history[:-HISTORY_KEEP]
+        transcript = "\n".join(f"{m['role'].upper()}: {m['content']}" for m in older)
+        try:
+            summary = await chat_text(
+                _SUMMARY_PROMPT, [{"role": "user", "content": transcript}]
+            )
+        except Exception:
+            logger.exception("History summarization failed; keeping full history")
+            return
+
+        session.conversation_history = [
+            {"role": "system", "content": f"PRIOR CONVERSATION SUMMARY: {summary}"},
+            *history[-HISTORY_KEEP:],
+        ]
+
+    async def _store_batched_report(
+        self, session_id: str, result: dict | None
+    ) -> None:
+        async with self.store.lock(session_id):
+            session = await self._load(session_id)
+            if session is None:
+                logger.warning(
+                    "Session %s expired before its batched report finished", session_id
+                )
+                return
+            if session.state != "report_pending":
+                return
+            knowledge = self._case_knowledge.get(session.case_type)
+            if result is None:
+                # Batch failed or expired; fall back to a live call
+                session.report = await generate_report(
+                    session, knowledge, self.report_cache
+                )
+            else:
+                session.report = finish_report(result, session_id, knowledge)
+            session.state = "complete"
+            await self._save(session)
+
+    async def _speculative_intake(self, session: SessionState) -> dict:
+        """Classify and gather facts in parallel when last turn's guess was close.
+
+        If the classifier confirms the guess, the fact-gathering answer is used
+        and the caller gets their first real question a round trip earlier.
+        Otherwise the speculative call is cancelled.
+        """
+        speculative = replace(
+            session,
+            case_type=session.case_type_guess,
+            case_type_confidence=session.case_type_guess_confidence,
+        )
+        history = session.conversation_history
+        classify_task = asyncio.create_task(
+            chat_json(self._classification_prompt(), history)
+        )
+        fact_task = asyncio.create_task(
+            chat_json(self._fact_gathering_prompt(speculative), history)
+        )
+
+        try:
+            classified = await classify_task
+        except BaseException:
+            fact_task.cancel()
+            raise
+
+        confirmed = (
+            classified.get("case_type") == session.case_type_guess
+            and classified.get("case_type_confidence", 0) > 0.7
+        )
+        if not confirmed:
+            fact_task.cancel()
+            return classified
+
+        [gathered] = await asyncio.gather(fact_task, return_exceptions=True)
+        if isinstance(gathered, BaseException):
+            return classified
+
+        gathered["extracted_facts"] = {
+            **(classified.get("extracted_facts") or {}),
+            **(gathered.get("extracted_facts") or {}),
+        }
+        gathered["case_type"] = classified["case_type"]
+        gathered["case_type_confidence"] = classified["case_type_confidence"]
+        return gathered
+
     async def _finalize(self, session: SessionState) -> dict:
         if session.case_type is None:
             session.state = "intake"
@@ -119,10 +360,18 @@ class IntakeEngine:
                 "ready_for_report": False,
             }
 
-        knowledge = CASE_KNOWLEDGE.get(session.case_type)
-        report = await generate_report(session, knowledge)
-        session.report = report
-        session.state = "complete"
+        knowledge = self._case_knowledge.get(session.case_type)
+        if session.report is not None:
+            session.state = "complete"
+        elif settings.report_batch_enabled and knowledge is not None:
+            prompt, messages = build_report_request(session, knowledge)
+            await self.report_batcher.enqueue(session.session_id, prompt, messages)
+            session.state = "report_pending"
+        else:
+            session.report = await generate_report(
+                session, knowledge, self.report_cache
+            )
+            session.state = "complete"
 
         return {
                 "message": (
@@ -144,40 +393,10 @@ class IntakeEngine:
         return self._fact_gathering_prompt(session)
 
     def _classification_prompt(self) -> str:
-        case_lines = []
-        for knowledge in CASE_KNOWLEDGE.values():
-            case_lines.append(
-                f"  - type key: \"{knowledge.case_type}\"\n"
-                f"    name: {knowledge.display_name}\n"
-                f"    keywords: {', '.join(knowledge.keywords)}"
-            )
-        case_block = "\n".join(case_lines)
-
-        return (
-            f"You are a friendly, concise legal intake assistant for {settings.firm_name}, "
-            "a Texas criminal defense law firm.\n\n"
-            "YOUR JOB: Quickly figure out what happened and gather the key facts "
-            "so the attorneys can decide whether to take the case.\n\n"
-            "RULES:\n"
-            "- Sound like a real person — warm, calm, never robotic.\n"
-            "- ONE short question at a time. Max 1-2 sentences per response.\n"
-            "- Never give legal opinions or predictions. If asked, say: \"The attorney can go over that with you.\"\n"
-            "- Don't over-explain. Get to the point.\n\n"
-            "CASE TYPES YOU CAN IDENTIFY:\n"
-            f"{case_block}\n\n"
-            "Identify the case type as fast as possible, then start asking the most important questions.\n\n"
-            "RESPOND WITH THIS EXACT JSON FORMAT:\n"
-            "{\n"
-            '  "extracted_facts": {},\n'
-            '  "case_type": "dwi" or "parking_ticket" or null,\n'
-            '  "case_type_confidence": 0.0 to 1.0,\n'
-            '  "response": "your response — short and conversational",\n'
-            '  "ready_for_report": false\n'
-            "}\n"
-        )
+        return _CLASSIFICATION_PROMPT
 
     def _fact_gathering_prompt(self, session: SessionState) -> str:
-        knowledge = CASE_KNOWLEDGE[session.case_type]
+        knowledge = self._case_knowledge[session.case_type]
         gathered = session.gathered_facts
 
         missing = self._get_missing_facts(knowledge, gathered)
@@ -187,41 +406,17 @@ class IntakeEngine:
             or "  (none yet)"
         )
         missing_lines = "\n".join(
-            f"  [priority {f.priority}] {f.key}: \"{f.question}\""
-            for f in missing[:6]
+            f"  [priority {f.priority}] {f.key}" for f in missing[:6]
         )
 
         readiness = self._assess_readiness(knowledge, gathered)
 
-        return (
-            f"You are a friendly, concise legal intake assistant for {settings.firm_name}, "
-            "a Texas criminal defense law firm.\n\n"
-            f"CASE TYPE: {knowledge.display_name}\n"
-            f"JURISDICTION: {knowledge.jurisdiction}\n\n"
-            "RULES:\n"
-            "- Sound like a real, caring person. Short, natural sentences.\n"
-            "- ONE question per response. Max 1-2 sentences.\n"
-            "- Briefly acknowledge what they said, then ask the next thing.\n"
-            "- Never give legal opinions. If asked: \"The attorney can go over that with you.\"\n"
-            "- Don't repeat questions already answered.\n\n"
-            "FACTS ALREADY GATHERED:\n"
-            f"{gathered_lines}\n\n"
-            "FACTS STILL NEEDED (ask highest priority first):\n"
-            f"{missing_lines}\n\n"
-            f"{readiness}\n\n"
-            "EXTRACTION RULES:\n"
-            "- Only extract facts the caller explicitly stated or clearly implied.\n"
-            "- Use the fact key names listed above.\n"
-            "- Set value to null if not mentioned.\n\n"
-            "RESPOND WITH THIS EXACT JSON FORMAT:\n"
-            "{\n"
-            f'  "extracted_facts": {{...new facts from the latest message...}},\n'
-            f'  "case_type": "{session.case_type}",\n'
-            f'  "case_type_confidence": {session.case_type_confidence},\n'
-            '  "response": "your conversational response",\n'
-            '  "ready_for_report": true or false\n'
-            "}\n"
-        )
+        return _FACT_PROMPT_TEMPLATES[session.case_type].format_map({
+            "gathered_lines": gathered_lines,
+            "missing_lines": missing_lines,
+            "readiness": readiness,
+            "case_type_confidence": session.case_type_confidence,
+        })
 
     # ------------------------------------------------------------------
     # Helpers
@@ -232,7 +427,7 @@ class IntakeEngine:
         knowledge: CaseTypeKnowledge, gathered: dict
     ) -> list:
         missing = []
-        for fact in knowledge.facts:
+        for fact in knowledge._facts_by_priority:
             if fact.key in gathered:
                 continue
             if fact.follow_up_condition:
@@ -245,24 +440,14 @@ class IntakeEngine:
                 if skip:
                     continue
             missing.append(fact)
-        missing.sort(key=lambda f: f.priority)
         return missing
 
     @staticmethod
     def _assess_readiness(
         knowledge: CaseTypeKnowledge, gathered: dict
     ) -> str:
-        p1_facts = [
-            f for f in knowledge.facts
-            if f.priority == 1 and not f.follow_up_condition
-        ]
-        p2_facts = [
-            f for f in knowledge.facts
-            if f.priority == 2 and not f.follow_up_condition
-        ]
-
-        p1_done = all(f.key in gathered for f in p1_facts)
-        p2_done = all(f.key in gathered for f in p2_facts)
+        p1_done = knowledge._p1_required <= gathered.keys()
+        p2_done = knowledge._p2_required <= gathered.keys()
 
         if p1_done and p2_done:
             return (
@@ -278,4 +463,125 @@ class IntakeEngine:
         return "STATUS: Still gathering critical facts."
 
 
+_SUMMARY_PROMPT = (
+    "Summarize this conversation between a legal intake assistant and a "
+    "potential client in under 150 words. Keep every fact the client stated "
+    "(dates, numbers, yes/no answers) and any questions they asked. "
+    "Plain text, no preamble."
+)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+def _build_prompt_header() -> str:
+    """Opening shared byte-for-byte by every intake prompt.
+
+    Nothing per-session or per-turn goes here, so OpenAI's prefix prompt
+    cache can reuse it across all sessions.
+    """
+    case_lines = []
+    for knowledge in CASE_KNOWLEDGE.values():
+        case_lines.append(
+            f"  - type key: \"{knowledge.case_type}\"\n"
+            f"    name: {knowledge.display_name}\n"
+            f"    keywords: {knowledge._keywords_csv}"
+        )
+    case_block = "\n".join(case_lines)
+
+    return (
+        f"You are a friendly, concise legal intake assistant for {settings.firm_name}, "
+        "a Texas criminal defense law firm.\n\n"
+        "YOUR JOB: Quickly figure out what happened and gather the key facts "
+        "so the attorneys can decide whether to take the case.\n\n"
+        "RULES:\n"
+        "- Sound like a real, caring person — warm, calm, never robotic. Short, natural sentences.\n"
+        "- ONE short question at a time. Max 1-2 sentences per response.\n"
+        "- Briefly acknowledge what they said, then ask the next thing.\n"
+        "- Never give legal opinions or predictions. If asked, say: \"The attorney can go over that with you.\"\n"
+        "- Don't over-explain, and don't repeat questions already answered.\n\n"
+        "CASE TYPES YOU CAN IDENTIFY:\n"
+        f"{case_block}\n\n"
+    )
+
+
+def _build_classification_prompt() -> str:
+    return (
+        _PROMPT_HEADER
+        + "Identify the case type as fast as possible, then start asking the most important questions.\n\n"
+        "RESPOND WITH THIS EXACT JSON FORMAT:\n"
+        "{\n"
+        '  "extracted_facts": {},\n'
+        '  "case_type": "dwi" or "parking_ticket" or null,\n'
+        '  "case_type_confidence": 0.0 to 1.0,\n'
+        '  "response": "your response — short and conversational",\n'
+        '  "ready_for_report": false\n'
+        "}\n"
+    )
+
+
+def _build_fact_prompt_template(knowledge: CaseTypeKnowledge) -> str:
+    """Fact-gathering prompt with only the per-turn fields left as placeholders.
+
+    Everything static comes first; the per-turn fields sit at the very end
+    so the cacheable prefix covers as much of the prompt as possible.
+    """
+
+    def esc(value: str) -> str:
+        return value.replace("{", "{{").replace("}", "}}")
+
+    fact_block = "\n".join(
+        f"  [priority {f.priority}] {f.key}: \"{f.question}\""
+        for f in knowledge._facts_by_priority
+    )
+
+    return (
+        esc(_PROMPT_HEADER)
+        + f"CASE TYPE: {esc(knowledge.display_name)}\n"
+        f"JURISDICTION: {esc(knowledge.jurisdiction)}\n\n"
+        "FACTS TO GATHER FOR THIS CASE TYPE:\n"
+        f"{esc(fact_block)}\n\n"
+        "EXTRACTION RULES:\n"
+        "- Only extract facts the caller explicitly stated or clearly implied.\n"
+        "- Use the fact key names listed above.\n"
+        "- Set value to null if not mentioned.\n\n"
+        "RESPOND WITH THIS EXACT JSON FORMAT:\n"
+        "{{\n"
+        '  "extracted_facts": {{...new facts from the latest message...}},\n'
+        f'  "case_type": "{esc(knowledge.case_type)}",\n'
+        '  "case_type_confidence": 0.0 to 1.0,\n'
+        '  "response": "your conversational response",\n'
+        '  "ready_for_report": true or false\n'
+        "}}\n\n"
+        "CURRENT CASE TYPE CONFIDENCE: {case_type_confidence}\n\n"
+        "FACTS ALREADY GATHERED:\n"
+        "{gathered_lines}\n\n"
+        "FACTS STILL NEEDED (ask highest priority first):\n"
+        "{missing_lines}\n\n"
+        "{readiness}\n"
+    )
+
+
+def _build_keyword_index() -> tuple[re.Pattern, dict[str, str]]:
+    case_types = {
+        keyword.lower(): knowledge.case_type
+        for knowledge in CASE_KNOWLEDGE.values()
+        for keyword in knowledge.keywords + knowledge.strong_keywords
+    }
+    # Longest first so "parking ticket" wins over a shorter overlapping keyword
+    alternation = "|".join(
+        re.escape(k) for k in sorted(case_types, key=len, reverse=True)
+    )
+    return re.compile(rf"\b(?:{alternation})\b"), case_types
+
+
+_KEYWORD_RE, _KEYWORD_CASE_TYPES = _build_keyword_index()
+_PROMPT_HEADER = _build_prompt_header()
+_CLASSIFICATION_PROMPT = _build_classification_prompt()
+_FACT_PROMPT_TEMPLATES = {
+    case_type: _build_fact_prompt_template(knowledge)
+    for case_type, knowledge in CASE_KNOWLEDGE.items()
+}
+
 engine = IntakeEngine()
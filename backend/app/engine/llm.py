@@ -1,39 +1,114 @@
-import json
+import asyncio
 import logging
+from typing import Any, AsyncIterator
 
-from openai import AsyncOpenAI
+import httpx
+import orjson
+from openai import (
+    APIConnectionError,
+    AsyncOpenAI,
+    InternalServerError,
+    RateLimitError,
+)
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random_exponential,
+)
 
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# One pooled connection pool for every OpenAI call in this process.
+_http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=512, max_keepalive_connections=256),
+    timeout=httpx.Timeout(60.0, connect=5.0),
+    http2=True,
+)
+
+# Caps in-flight OpenAI requests per process so bursts don't turn into 429s
+_sem = asyncio.Semaphore(settings.openai_max_concurrency or 32)
+
 _client: AsyncOpenAI | None = None
 
 
 def _get_client() -> AsyncOpenAI:
     global _client
     if _client is None:
-        _client = AsyncOpenAI(api_key=settings.openai_api_key)
+        _client = AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url or None,
+            http_client=_http_client,
+            max_retries=0,  # retries are handled by _retry below
+        )
     return _client
 
 
-async def chat_json(system_prompt: str, messages: list[dict]) -> dict:
-    """Single LLM call that returns parsed JSON."""
-    client = _get_client()
-    response = await client.chat.completions.create(
-        model=settings.openai_model,
-        response_format={"type": "json_object"},
-        messages=[
+async def aclose() -> None:
+    """Close the shared HTTP connection pool."""
+    await _http_client.aclose()
+
+
+_backoff = wait_random_exponential(min=0.5, max=8)
+
+
+def _wait(retry_state) -> float:
+    """Honor the server's Retry-After when present, else jittered backoff."""
+    exc = retry_state.outcome.exception()
+    response = getattr(exc, "response", None)
+    if response is not None:
+        try:
+            return min(float(response.headers["retry-after"]), 30.0)
+        except (KeyError, ValueError):
+            pass
+    return _backoff(retry_state)
+
+
+# APITimeoutError is a subclass of APIConnectionError
+_retry = retry(
+    retry=retry_if_exception_type(
+        (RateLimitError, APIConnectionError, InternalServerError)
+    ),
+    wait=_wait,
+    stop=stop_after_attempt(4),
+    reraise=True,
+)
+
+
+# Ask local runners to keep the KV cache for the shared prompt prefix
+_extra_body = {"cache_prompt": True} if settings.llm_cache_prompt else None
+
+
+def _json_request(system_prompt: str, messages: list[dict]) -> dict:
+    return {
+        "model": settings.openai_model,
+        "response_format": {"type": "json_object"},
+        "messages": [
             {"role": "system", "content": system_prompt},
             *messages,
         ],
-        temperature=0.3,
-        max_tokens=1024,
-    )
-    raw = response.choices[0].message.content
+        "temperature": 0.3,
+        "max_tokens": 1024,
+    }
+
+
+@_retry
+async def chat_json(system_prompt: str, messages: list[dict]) -> dict:
+    """Single LLM call that returns parsed JSON."""
+    client = _get_client()
+    async with _sem:
+        response = await client.chat.completions.create(
+            **_json_request(system_prompt, messages), extra_body=_extra_body
+        )
+    return _parse_json(response.choices[0].message.content)
+
+
+def _parse_json(raw: str) -> dict:
     try:
-        return json.loads(raw)
-    except json.JSONDecodeError:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
         logger.error("LLM returned invalid JSON: %s", raw[:500])
         return {
             "extracted_facts": {},
@@ -44,16 +119,187 @@ async def chat_json(system_prompt: str, messages: list[dict]) -> dict:
         }
 
 
+async def chat_json_stream(
+    system_prompt: str, messages: list[dict]
+) -> AsyncIterator[tuple[str, Any]]:
+    """Streaming variant of chat_json.
+
+    Yields ("delta", text) as the top-level "response" string arrives, then
+    a single ("result", parsed_dict) once the whole object is in.
+    """
+    parser = _ResponseFieldParser()
+    async with _sem:
+        stream = await _open_stream(system_prompt, messages)
+        # Closes the response (and frees its pooled connection) on
+        # cancellation or disconnect too, not just at the end
+        async with stream:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    text = parser.feed(content)
+                    if text:
+                        yield "delta", text
+    yield "result", _parse_json(parser.buf)
+
+
+@_retry
+async def _open_stream(system_prompt: str, messages: list[dict]):
+    # Only opening the stream is retried; once deltas have gone out to
+    # the caller a failure can't be replayed.
+    return await _get_client().chat.completions.create(
+        **_json_request(system_prompt, messages),
+        stream=True,
+        extra_body=_extra_body,
+    )
+
+
+class _ResponseFieldParser:
+    """Incrementally extracts the top-level "response" string of a JSON object."""
+
+    def __init__(self) -> None:
+        self.buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_key: str | None = None
+        self._after_colon = False
+        self._value_start: int | None = None
+        self._value_end: int | None = None
+        self._emitted = 0
+
+    def feed(self, chunk: str) -> str:
+        self.buf += chunk
+        buf = self.buf
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1 and not self._after_colon:
+                        self._last_key = buf[self._string_start:i]
+                    elif self._value_start == self._string_start:
+                        self._value_end = i
+                    self._after_colon = False
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i + 1
+                if (
+                    self._depth == 1
+                    and self._after_colon
+                    and self._last_key == "response"
+                    and self._value_start is None
+                ):
+                    self._value_start = i + 1
+            elif c in "{[":
+                self._depth += 1
+                self._after_colon = False
+            elif c in "}]":
+                self._depth -= 1
+            elif c == ":" and self._depth == 1:
+                self._after_colon = True
+            elif c == "," and self._depth == 1:
+                self._after_colon = False
+        self._pos = len(buf)
+        return self._new_text()
+
+    def _new_text(self) -> str:
+        if self._value_start is None:
+            return ""
+        end = self._value_end if self._value_end is not None else len(self.buf)
+        raw = self.buf[self._value_start:end]
+        # Trim a trailing, partially received escape sequence
+        for cut in range(len(raw), max(len(raw) - 6, -1), -1):
+            try:
+                decoded = orjson.loads(f'"{raw[:cut]}"')
+                break
+            except orjson.JSONDecodeError:
+                continue
+        else:
+            return ""
+        new = decoded[self._emitted:]
+        self._emitted = len(decoded)
+        return new
+
+
+@_retry
 async def chat_text(system_prompt: str, messages: list[dict]) -> str:
     """Single LLM call that returns plain text."""
     client = _get_client()
-    response = await client.chat.completions.create(
-        model=settings.openai_model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            *messages,
-        ],
-        temperature=0.3,
-        max_tokens=2048,
-    )
+    async with _sem:
+        response = await client.chat.completions.create(
+            model=settings.openai_model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                *messages,
+            ],
+            temperature=0.3,
+            max_tokens=2048,
+            extra_body=_extra_body,
+        )
     return response.choices[0].message.content
+
+
+async def submit_json_batch(
+    requests: list[tuple[str, str, list[dict]]],
+) -> str:
+    """Submit (custom_id, system_prompt, messages) requests to the Batch API.
+
+    Returns the batch id to poll with fetch_json_batch().
+    """
+    client = _get_client()
+    lines = [
+        orjson.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": _json_request(system_prompt, messages),
+        })
+        for custom_id, system_prompt, messages in requests
+    ]
+    batch_file = await client.files.create(
+        file=("requests.jsonl", b"\n".join(lines)),
+        purpose="batch",
+    )
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+async def fetch_json_batch(batch_id: str) -> dict[str, dict | None] | None:
+    """Return parsed results keyed by custom_id, or None while still running.
+
+    Requests that failed inside a finished batch map to None.
+    """
+    client = _get_client()
+    batch = await client.batches.retrieve(batch_id)
+    if batch.status in ("validating", "in_progress", "finalizing"):
+        return None
+
+    results: dict[str, dict | None] = {}
+    if batch.status != "completed" or not batch.output_file_id:
+        logger.error("Batch %s ended with status %s", batch_id, batch.status)
+        return results
+
+    content = await client.files.content(batch.output_file_id)
+    for line in content.text.splitlines():
+        if not line.strip():
+            continue
+        item = orjson.loads(line)
+        response = item.get("response") or {}
+        if response.get("status_code") != 200:
+            results[item["custom_id"]] = None
+            continue
+        raw = response["body"]["choices"][0]["message"]["content"]
+        results[item["custom_id"]] = _parse_json(raw)
+    return results
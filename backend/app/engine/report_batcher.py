@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable
+
+from ..config import settings
+from .llm import fetch_json_batch, submit_json_batch
+
+if TYPE_CHECKING:
+    from .session_store import MemorySessionStore, RedisSessionStore
+
+logger = logging.getLogger(__name__)
+
+# Called with (session_id, parsed result) once a batch finishes;
+# result is None when that request failed inside the batch.
+ResultCallback = Callable[[str, dict | None], Awaitable[None]]
+
+# Batch API jobs may take up to their 24h completion window; anything
+# waiting on one must outlive it or the finished report has nowhere to go.
+REPORT_PENDING_TTL = 25 * 3600
+
+# How long a worker's claim on a persisted entry blocks the others at startup
+RESUME_CLAIM_TTL = 60
+
+
+class ReportBatcher:
+    """Collects report requests and submits them through the OpenAI Batch API.
+
+    Requests are flushed when `batch_size` are queued or `window` seconds
+    after the first one arrived, whichever comes first.
+
+    With a `store`, queued requests ("queued:<session_id>") and submitted
+    batches ("batch:<batch_id>") are persisted until they finish, and
+    resume() picks them back up after a restart.
+    """
+
+    def __init__(
+        self,
+        on_result: ResultCallback,
+        store: "MemorySessionStore | RedisSessionStore | None" = None,
+        batch_size: int = settings.report_batch_size,
+        window: float = settings.report_batch_window_seconds,
+        poll_interval: float = settings.report_batch_poll_seconds,
+    ) -> None:
+        self.on_result = on_result
+        self.store = store
+        self.batch_size = batch_size
+        self.window = window
+        self.poll_interval = poll_interval
+        self.report_queue: asyncio.Queue[tuple[str, str, list[dict]]] = asyncio.Queue()
+        self._tasks: set[asyncio.Task] = set()
+        self._worker: asyncio.Task | None = None
+
+    async def enqueue(
+        self, session_id: str, system_prompt: str, messages: list[dict]
+    ) -> None:
+        if self.store is not None:
+            await self.store.set(
+                f"queued:{session_id}",
+                {"system_prompt": system_prompt, "messages": messages},
+                REPORT_PENDING_TTL,
+            )
+        self._put(session_id, system_prompt, messages)
+
+    async def resume(self) -> None:
+        """Re-queue and re-poll whatever a previous process left persisted.
+
+        Every worker calls this at startup; a short claim per entry keeps
+        them from picking up the same one.
+        """
+        if self.store is None:
+            return
+        for key in await self.store.keys():
+            kind, _, key_id = key.partition(":")
+            if kind not in ("queued", "batch"):
+                continue
+            if not await self.store.add(f"resume:{key}", {}, RESUME_CLAIM_TTL):
+                continue
+            data = await self.store.get(key)
+            if data is None:
+                continue
+            if kind == "queued":
+                self._put(key_id, data["system_prompt"], data["messages"])
+            else:
+                logger.info("Resuming report batch %s", key_id)
+                self._spawn(self._wait(key_id, data["session_ids"]))
+
+    async def close(self) -> None:
+        # Anything persisted is resumed by the next process
+        for task in [self._worker, *self._tasks]:
+            if task is not None:
+                task.cancel()
+
+    def _put(self, session_id: str, system_prompt: str, messages: list[dict]) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        self.report_queue.put_nowait((session_id, system_prompt, messages))
+
+    def _spawn(self, coro: Awaitable[None]) -> None:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self.report_queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self.report_queue.get(), remaining)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            self._spawn(self._submit_and_wait(batch))
+
+    async def _submit_and_wait(
+        self, batch: list[tuple[str, str, list[dict]]]
+    ) -> None:
+        session_ids = [session_id for session_id, _, _ in batch]
+        try:
+            batch_id = await submit_json_batch(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Report batch submission failed")
+            await self._deliver(session_ids, {})
+            return
+
+        logger.info("Submitted report batch %s (%d reports)", batch_id, len(batch))
+        if self.store is not None:
+            await self.store.set(
+                f"batch:{batch_id}", {"session_ids": session_ids}, REPORT_PENDING_TTL
+            )
+            for session_id in session_ids:
+                await self.store.delete(f"queued:{session_id}")
+        await self._wait(batch_id, session_ids)
+
+    async def _wait(self, batch_id: str, session_ids: list[str]) -> None:
+        results: dict[str, dict | None] = {}
+        try:
+            while True:
+                await asyncio.sleep(self.poll_interval)
+                done = await fetch_json_batch(batch_id)
+                if done is not None:
+                    results = done
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Report batch %s failed", batch_id)
+
+        await self._deliver(session_ids, results)
+        if self.store is not None:
+            await self.store.delete(f"batch:{batch_id}")
+
+    async def _deliver(
+        self, session_ids: list[str], results: dict[str, dict | None]
+    ) -> None:
+        for session_id in session_ids:
+            try:
+                await self.on_result(session_id, results.get(session_id))
+            except Exception:
+                logger.exception("Could not store report for %s", session_id)
+            if self.store is not None:
+                await self.store.delete(f"queued:{session_id}")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
 import logging
 from typing import TYPE_CHECKING, Any
 
@@ -10,17 +11,66 @@ from .llm import chat_json
 
 if TYPE_CHECKING:
     from .intake_engine import SessionState
+    from .session_store import MemorySessionStore, RedisSessionStore
 
 logger = logging.getLogger(__name__)
 
+# Report calls currently running, keyed by prompt digest
+_inflight: dict[str, asyncio.Future] = {}
+
 
 async def generate_report(
     session: "SessionState",
     knowledge: CaseTypeKnowledge | None,
+    cache: "MemorySessionStore | RedisSessionStore | None" = None,
 ) -> dict:
+    """Generate the attorney report for a session.
+
+    The prompt fully determines the report (case type, facts, transcript),
+    so results are memoized on its digest: repeated finalizes and double
+    clicks reuse the first call instead of issuing another one.
+    """
     if knowledge is None:
         return _empty_report(session.session_id)
 
+    prompt, messages = build_report_request(session, knowledge)
+    digest = hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+
+    result = await cache.get(digest) if cache is not None else None
+    if result is None:
+        result = await _generate_once(digest, prompt, messages)
+        if cache is not None:
+            await cache.set(digest, result)
+
+    return finish_report(dict(result), session.session_id, knowledge)
+
+
+async def _generate_once(
+    digest: str, prompt: str, messages: list[dict]
+) -> dict:
+    pending = _inflight.get(digest)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[digest] = future
+    try:
+        result = await chat_json(prompt, messages)
+    except BaseException as exc:
+        future.set_exception(exc)
+        future.exception()  # mark retrieved when nobody else is waiting
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        del _inflight[digest]
+
+
+def build_report_request(
+    session: "SessionState", knowledge: CaseTypeKnowledge
+) -> tuple[str, list[dict]]:
+    """System prompt and messages for the report call (live or batched)."""
     prompt = _build_report_prompt(session, knowledge)
 
     messages = [
@@ -32,9 +82,13 @@ async def generate_report(
             ),
         }
     ]
+    return prompt, messages
+
 
-    result = await chat_json(prompt, messages)
-    result["session_id"] = session.session_id
+def finish_report(
+    result: dict, session_id: str, knowledge: CaseTypeKnowledge
+) -> dict:
+    result["session_id"] = session_id
     result.setdefault("case_type", knowledge.case_type)
     result.setdefault("case_type_display", knowledge.display_name)
     result.setdefault("jurisdiction", knowledge.jurisdiction)
@@ -44,7 +98,7 @@ async def generate_report(
 def _build_report_prompt(
     session: "SessionState", knowledge: CaseTypeKnowledge
 ) -> str:
-    facts_block = json.dumps(session.gathered_facts, indent=2)
+    facts_block = session.facts_json()
 
     offense_block = "\n".join(
         f"  - {ol.name} ({ol.classification}): "
@@ -62,10 +116,7 @@ def _build_report_prompt(
     pass_block = "\n".join(f"  - {s}" for s in knowledge.pass_signals)
     review_block = "\n".join(f"  - {s}" for s in knowledge.review_signals)
 
-    conversation_summary = "\n".join(
-        f"  {m['role'].upper()}: {m['content'][:300]}"
-        for m in session.conversation_history
-    )
+    conversation_summary = "\n".join(session.summary_lines)
 
     return (
         "You are a legal case evaluation assistant. Generate a structured "
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import orjson
+
+from ..config import settings
+
+# Longest a turn may hold a session's lock; covers an LLM call with all of
+# its retries. Waiters give up after the same time.
+LOCK_TIMEOUT = 300
+
+
+class MemorySessionStore:
+    """In-process session store with the same TTL semantics as Redis.
+
+    Used when no REDIS_URL is configured (local dev, single worker).
+    """
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        # Ordered by last write; with the default TTL the oldest entries
+        # expire first, so expired sessions are evicted from the front. An
+        # entry written with a longer TTL only delays eviction behind it;
+        # get() still checks each entry's own expiry.
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        # session_id -> [lock, number of holders and waiters]
+        self._locks: dict[str, list] = {}
+
+    async def get(self, session_id: str) -> dict | None:
+        entry = self._data.get(session_id)
+        if entry is None:
+            return None
+        expires_at, raw = entry
+        if expires_at < time.monotonic():
+            del self._data[session_id]
+            return None
+        return orjson.loads(raw)
+
+    async def set(
+        self, session_id: str, data: dict, ttl: int | None = None
+    ) -> None:
+        now = time.monotonic()
+        self._data[session_id] = (now + (ttl or self.ttl), orjson.dumps(data))
+        self._data.move_to_end(session_id)
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if oldest[0] >= now:
+                break
+            self._data.popitem(last=False)
+
+    async def add(self, session_id: str, data: dict, ttl: int | None = None) -> bool:
+        """Set only if absent; returns whether it was set."""
+        if await self.exists(session_id):
+            return False
+        await self.set(session_id, data, ttl)
+        return True
+
+    async def delete(self, session_id: str) -> None:
+        self._data.pop(session_id, None)
+
+    async def keys(self) -> list[str]:
+        now = time.monotonic()
+        return [k for k, (expires_at, _) in self._data.items() if expires_at >= now]
+
+    async def exists(self, session_id: str) -> bool:
+        return await self.get(session_id) is not None
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        """Serialize load-modify-save cycles on one session."""
+        entry = self._locks.setdefault(session_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with asyncio.timeout(LOCK_TIMEOUT):
+                await entry[0].acquire()
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[session_id]
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class RedisSessionStore:
+    """Redis-backed session store shared by every worker process."""
+
+    def __init__(self, url: str, ttl: int, prefix: str = "session") -> None:
+        from redis.asyncio import Redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self._redis = Redis.from_url(url)
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}:{session_id}"
+
+    async def get(self, session_id: str) -> dict | None:
+        raw = await self._redis.get(self._key(session_id))
+        if raw is None:
+            return None
+        return orjson.loads(raw)
+
+    async def set(
+        self, session_id: str, data: dict, ttl: int | None = None
+    ) -> None:
+        await self._redis.set(
+            self._key(session_id), orjson.dumps(data), ex=ttl or self.ttl
+        )
+
+    async def add(self, session_id: str, data: dict, ttl: int | None = None) -> bool:
+        """Set only if absent; returns whether it was set."""
+        return bool(await self._redis.set(
+            self._key(session_id), orjson.dumps(data), ex=ttl or self.ttl, nx=True
+        ))
+
+    async def delete(self, session_id: str) -> None:
+        await self._redis.delete(self._key(session_id))
+
+    async def keys(self) -> list[str]:
+        start = len(self.prefix) + 1
+        return [
+            key.decode()[start:]
+            async for key in self._redis.scan_iter(match=self._key("*"))
+        ]
+
+    async def exists(self, session_id: str) -> bool:
+        return bool(await self._redis.exists(self._key(session_id)))
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        """Serialize load-modify-save cycles on one session across workers."""
+        async with self._redis.lock(
+            f"lock:{self._key(session_id)}",
+            timeout=LOCK_TIMEOUT,
+            blocking_timeout=LOCK_TIMEOUT,
+        ):
+            yield
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+def create_session_store(
+    prefix: str = "session",
+) -> MemorySessionStore | RedisSessionStore:
+    if settings.redis_url:
+        return RedisSessionStore(
+            settings.redis_url, settings.session_ttl_seconds, prefix
+        )
+    return MemorySessionStore(settings.session_ttl_seconds)
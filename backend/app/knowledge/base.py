@@ -43,3 +43,20 @@ class CaseTypeKnowledge:
     pass_signals: list[str]
     review_signals: list[str]
     keywords: list[str]  # for initial classification from caller's description
+    # Keywords specific enough to classify on their own, without an LLM call
+    strong_keywords: list[str] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        # Precomputed views used on every intake turn
+        self._p1_required = frozenset(
+            f.key for f in self.facts
+            if f.priority == 1 and not f.follow_up_condition
+        )
+        self._p2_required = frozenset(
+            f.key for f in self.facts
+            if f.priority == 2 and not f.follow_up_condition
+        )
+        self._facts_by_priority = tuple(
+            sorted(self.facts, key=lambda f: f.priority)
+        )
+        self._keywords_csv = ", ".join(self.keywords)
@@ -281,4 +281,7 @@ TEXAS_DWI = CaseTypeKnowledge(
         "intoxicated", "blew", "breath test", "blood draw",
         "open container", "driving while intoxicated",
     ],
+    strong_keywords=[
+        "dwi", "dui", "drunk driving", "driving while intoxicated",
+    ],
 )
@@ -209,4 +209,7 @@ TEXAS_PARKING = CaseTypeKnowledge(
         "fire lane", "no parking", "street sweeping",
         "parking warrant", "unpaid ticket", "parking citation",
     ],
+    strong_keywords=[
+        "parking ticket", "parking citation", "parking violation",
+    ],
 )
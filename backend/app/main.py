@@ -1,12 +1,29 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api.chat import router as chat_router
+from .engine import llm
+from .engine.intake_engine import engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await engine.report_batcher.resume()
+    yield
+    await engine.report_batcher.close()
+    await engine.store.close()
+    await engine.batch_store.close()
+    await engine.report_cache.close()
+    await llm.aclose()
+
 
 app = FastAPI(
     title="LawLord",
     description="AI-powered legal intake assistant for criminal defense firms",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -0,0 +1,246 @@
+"""
+Database helpers shared by the fetch scripts.
+"""
+
+import csv
+import io
+import json
+from typing import Iterator
+
+import psycopg2
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # opinion_text_zst is left NULL
+    zstandard = None
+
+OPINION_COLUMNS = (
+    "source", "source_id", "case_name", "court", "court_full_name",
+    "date_filed", "docket_number", "citations", "case_type",
+    "opinion_type", "opinion_text", "opinion_text_zst", "summary", "outcome",
+    "judges", "statutes_cited", "tags", "metadata",
+)
+
+ARRAY_COLUMNS = {"citations", "judges", "statutes_cited", "tags"}
+
+BYTEA_COLUMNS = {"opinion_text_zst"}
+
+# Every column travels as one array parameter (text[] unless it's bytea)
+# and is cast back to its real type here, so a batch always binds one
+# parameter per column no matter how many rows it carries.
+_COLUMN_CASTS = {
+    "date_filed": "::date",
+    "metadata": "::jsonb",
+    **{c: "::text[]" for c in ARRAY_COLUMNS},
+}
+
+UNNEST_SQL = f"""
+    INSERT INTO case_opinions ({", ".join(OPINION_COLUMNS)})
+    SELECT {", ".join(c + _COLUMN_CASTS.get(c, "") for c in OPINION_COLUMNS)}
+    FROM unnest({", ".join(
+        "%s::bytea[]" if c in BYTEA_COLUMNS else "%s::text[]" for c in OPINION_COLUMNS
+    )})
+        AS t({", ".join(OPINION_COLUMNS)})
+    ON CONFLICT (source_id) DO NOTHING
+"""
+
+# Server-side prepared statement for the row-at-a-time path, so each row
+# skips parse/plan and only its parameters cross the wire.
+PREPARE_SQL = f"""
+    PREPARE insert_opinion AS
+    INSERT INTO case_opinions ({", ".join(OPINION_COLUMNS)})
+    VALUES ({", ".join(f"${i}" for i in range(1, len(OPINION_COLUMNS) + 1))})
+    ON CONFLICT (source_id) DO NOTHING
+"""
+
+EXECUTE_SQL = f"EXECUTE insert_opinion ({', '.join(['%s'] * len(OPINION_COLUMNS))})"
+
+# Initial loads into an empty table skip ON CONFLICT entirely
+COPY_SQL = f"""
+    COPY case_opinions ({", ".join(OPINION_COLUMNS)})
+    FROM STDIN WITH (FORMAT csv, NULL '\\N')
+"""
+
+# Rows per unnest statement or COPY chunk; bounded by memory (opinion texts run to
+# hundreds of KB), not by the bind-parameter limit.
+BATCH_SIZE = 1000
+# psycopg2 inlines the unnest arrays into the query text client-side, so a
+# batch is also cut once its text columns reach this many bytes.
+BATCH_MAX_BYTES = 32 * 1024 * 1024
+
+
+# UTF-8 bytes kept in opinion_text; also keeps the search_vector trigger
+# well under tsvector's 1MB limit.
+OPINION_TEXT_MAX_BYTES = 500_000
+SUMMARY_LENGTH = 500
+
+_zstd = zstandard.ZstdCompressor(level=3) if zstandard else None
+
+
+def text_columns(text: str | None) -> tuple[str | None, bytes | None, str | None]:
+    """Return the (opinion_text, opinion_text_zst, summary) column values.
+
+    opinion_text is capped at OPINION_TEXT_MAX_BYTES. When that cuts
+    anything off, the full text is kept zstd-compressed in
+    opinion_text_zst (if zstandard is installed).
+    """
+    if not text:
+        return None, None, text
+    summary = text[:SUMMARY_LENGTH]
+    if len(text) > SUMMARY_LENGTH:
+        summary += "..."
+
+    raw = text.encode("utf-8")
+    if len(raw) <= OPINION_TEXT_MAX_BYTES:
+        return text, None, summary
+    capped = raw[:OPINION_TEXT_MAX_BYTES].decode("utf-8", "ignore")
+    return capped, _zstd.compress(raw) if _zstd else None, summary
+
+
+def dump_json(obj) -> str:
+    """Serialize a value for a jsonb column, with orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def _pg_array(values: list) -> str:
+    """Render a list of strings as a Postgres array literal."""
+    items = (
+        '"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"'
+        for v in values
+    )
+    return "{" + ",".join(items) + "}"
+
+
+def _columnar(opinions: list[dict]) -> list[list]:
+    columns = []
+    for c in OPINION_COLUMNS:
+        if c in ARRAY_COLUMNS:
+            columns.append([_pg_array(op[c] or []) for op in opinions])
+        elif c in BYTEA_COLUMNS:
+            columns.append([op[c] for op in opinions])
+        else:
+            columns.append([
+                None if op[c] is None else str(op[c]) for op in opinions
+            ])
+    return columns
+
+
+def _csv_row(op: dict) -> list:
+    row = []
+    for c in OPINION_COLUMNS:
+        v = op[c]
+        if c in ARRAY_COLUMNS:
+            row.append(_pg_array(v or []))
+        elif v is None:
+            row.append("\\N")
+        elif c in BYTEA_COLUMNS:
+            row.append("\\x" + v.hex())
+        else:
+            row.append(v)
+    return row
+
+
+def _row_bytes(op: dict) -> int:
+    # Hex-encoded bytea doubles on the wire
+    return (
+        len(op["opinion_text"] or "")
+        + 2 * len(op["opinion_text_zst"] or b"")
+        + len(op["summary"] or "")
+    )
+
+
+def _batches(opinions: list[dict]) -> Iterator[list[dict]]:
+    """Split opinions into chunks of at most BATCH_SIZE rows / BATCH_MAX_BYTES."""
+    batch: list[dict] = []
+    size = 0
+    for op in opinions:
+        row_bytes = _row_bytes(op)
+        if batch and (len(batch) >= BATCH_SIZE or size + row_bytes > BATCH_MAX_BYTES):
+            yield batch
+            batch, size = [], 0
+        batch.append(op)
+        size += row_bytes
+    if batch:
+        yield batch
+
+
+def _copy_opinions(cur, opinions: list[dict]) -> int:
+    """Stream opinions in with COPY, one _batches() chunk at a time."""
+    for batch in _batches(opinions):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(_csv_row(op) for op in batch)
+        buf.seek(0)
+        cur.copy_expert(COPY_SQL, buf)
+    return len(opinions)
+
+
+def insert_opinions(db_url: str, opinions: list[dict]) -> int:
+    """Insert opinions into the database, skipping duplicates."""
+    conn = psycopg2.connect(db_url)
+    cur = conn.cursor()
+
+    # On reruns most records are already stored; one index lookup for the
+    # whole set is far cheaper than shipping them all to hit ON CONFLICT.
+    cur.execute(
+        "SELECT source_id FROM case_opinions WHERE source_id = ANY(%s)",
+        ([op["source_id"] for op in opinions],),
+    )
+    existing = {row[0] for row in cur.fetchall()}
+    opinions = [op for op in opinions if op["source_id"] not in existing]
+
+    inserted = 0
+    cur.execute("SELECT 1 FROM case_opinions LIMIT 1")
+    if opinions and cur.fetchone() is None:
+        try:
+            inserted = _copy_opinions(cur, opinions)
+            conn.commit()
+            opinions = []
+        except Exception as e:
+            # e.g. a duplicate source_id in the input; INSERT can skip those
+            print(f"  COPY failed ({e}); falling back to INSERT...")
+            conn.rollback()
+
+    cur.execute(PREPARE_SQL)
+    conn.commit()
+
+    for batch in _batches(opinions):
+        try:
+            cur.execute(UNNEST_SQL, _columnar(batch))
+            inserted += cur.rowcount
+            conn.commit()
+        except Exception as e:
+            print(f"  Batch insert failed ({e}); retrying row by row...")
+            conn.rollback()
+            inserted += _insert_rows(conn, cur, batch)
+
+    cur.close()
+    conn.close()
+    return inserted
+
+
+def _insert_rows(conn, cur, opinions: list[dict]) -> int:
+    """Row-at-a-time fallback so one bad record doesn't sink its batch.
+
+    Each row gets its own savepoint, so a failure only undoes that row and
+    the rest of the batch still goes in with a single commit.
+    """
+    inserted = 0
+    for op in opinions:
+        cur.execute("SAVEPOINT insert_row")
+        try:
+            cur.execute(EXECUTE_SQL, [op[c] for c in OPINION_COLUMNS])
+        except Exception as e:
+            print(f"  Error inserting {op.get('case_name', '?')}: {e}")
+            cur.execute("ROLLBACK TO SAVEPOINT insert_row")
+        else:
+            inserted += cur.rowcount
+            cur.execute("RELEASE SAVEPOINT insert_row")
+    conn.commit()
+    return inserted
@@ -19,16 +19,19 @@ CAP API docs: https://api.case.law/v1/
 """
 
 import argparse
-import json
 import os
 import re
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator
 
-import psycopg2
 import requests
 from dotenv import load_dotenv
 
+from .db import dump_json, insert_opinions, text_columns
+from .http import TIMEOUT, RateLimiter, iter_results, load_json, make_session
+
 load_dotenv()
 
 CAP_API_BASE = "https://api.case.law/v1"
@@ -43,15 +46,52 @@ DWI_SEARCH_TERMS = [
     "blood alcohol concentration",
 ]
 
+SESSION = make_session()
+
+# CAP publishes no rate limit; bodies are fetched one case per request,
+# so keep the detail workers to a polite steady rate between them.
+CAP_LIMITER = RateLimiter(10)
+DETAIL_WORKERS = 8
+
+DWI_SIGNALS = [
+    "dwi", "dui", "driving while intoxicated", "intoxication",
+    "blood alcohol", "49.04", "49.045", "49.07", "49.08",
+    "breathalyzer", "field sobriety",
+]
+
+_STATUTE_RE = re.compile(r"§\s*(\d+\.\d+)")
+_DWI_SIGNALS_RE = re.compile("|".join(map(re.escape, DWI_SIGNALS)), re.IGNORECASE)
+_OUTCOME_RE = re.compile(
+    r"(?P<rev_rem>reversed? and remand)"
+    r"|(?P<affirmed>affirm)"
+    r"|(?P<reversed>reverse)"
+    r"|(?P<remanded>remand)"
+    r"|(?P<dismissed>dismiss)",
+    re.IGNORECASE,
+)
+# In priority order: the highest-ranked outcome mentioned anywhere in the
+# tail wins, not the first one to appear.
+_OUTCOME_MAP = {
+    "rev_rem": "reversed and remanded",
+    "affirmed": "affirmed",
+    "reversed": "reversed",
+    "remanded": "remanded",
+    "dismissed": "dismissed",
+}
+
 
 def search_cases(
     query: str,
     jurisdiction: str = "tex",
     decision_date_min: str = "2000-01-01",
     max_pages: int = 50,
-) -> list[dict]:
-    """Search CAP for cases matching a query in a jurisdiction."""
-    all_cases = []
+) -> Iterator[dict]:
+    """Search CAP for cases matching a query in a jurisdiction.
+
+    Results are case metadata only; opinion bodies are fetched afterwards
+    with iter_case_details() for just the cases that survive dedupe.
+    """
+    total = 0
     url = f"{CAP_API_BASE}/cases/"
 
     params = {
@@ -60,7 +100,6 @@ def search_cases(
         "decision_date_min": decision_date_min,
         "ordering": "-decision_date",
         "page_size": 100,
-        "full_case": "true",
     }
 
     page = 0
@@ -69,26 +108,49 @@ def search_cases(
         print(f"  Page {page} for '{query}'...")
 
         try:
-            resp = requests.get(url, params=params if page == 1 else None)
+            resp = SESSION.get(
+                url, params=params if page == 1 else None,
+                timeout=TIMEOUT, stream=True,
+            )
             resp.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            if resp.status_code == 429:
-                print("  Rate limited. Waiting 60s...")
-                time.sleep(60)
-                continue
+        except requests.exceptions.RequestException as e:
             print(f"  HTTP error: {e}")
             break
 
-        data = resp.json()
-        results = data.get("results", [])
-        all_cases.extend(results)
-        print(f"  Got {len(results)} results (total: {len(all_cases)})")
+        next_page = {}
+        count = 0
+        with resp:
+            for case in iter_results(resp, next_page):
+                count += 1
+                yield case
+        total += count
+        print(f"  Got {count} results (total: {total})")
 
-        url = data.get("next")
+        url = next_page.get("next")
         params = None
         time.sleep(0.5)
 
-    return all_cases
+
+def fetch_case_detail(case_id: int) -> dict | None:
+    """Fetch a single case with its full opinion text."""
+    url = f"{CAP_API_BASE}/cases/{case_id}/"
+    CAP_LIMITER.acquire()
+    try:
+        resp = SESSION.get(url, params={"full_case": "true"}, timeout=TIMEOUT)
+        resp.raise_for_status()
+        return load_json(resp)
+    except Exception as e:
+        print(f"  Error fetching case {case_id}: {e}")
+        return None
+
+
+def iter_case_details(case_ids: list[int]) -> Iterator[tuple[int, dict | None]]:
+    """Fetch full cases concurrently, yielding (id, case) as each lands."""
+    print(f"  Fetching full text for {len(case_ids)} cases...")
+    with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as ex:
+        futures = {ex.submit(fetch_case_detail, cid): cid for cid in case_ids}
+        for f in as_completed(futures):
+            yield futures.pop(f), f.result()
 
 
 def extract_opinion_text(case_data: dict) -> str | None:
@@ -112,127 +174,85 @@ def extract_outcome(text: str) -> str | None:
     """Try to extract the case outcome."""
     if not text:
         return None
-    tail = text[-2000:].lower()
-    for outcome, patterns in [
-        ("reversed and remanded", ["reverse and remand", "reversed and remanded"]),
-        ("affirmed", ["affirm", "we affirm", "judgment is affirmed"]),
-        ("reversed", ["reverse", "we reverse", "judgment is reversed"]),
-        ("remanded", ["remand", "we remand"]),
-        ("dismissed", ["dismiss", "we dismiss"]),
-    ]:
-        if any(p in tail for p in patterns):
-            return outcome
-    return None
+    found = {m.lastgroup for m in _OUTCOME_RE.finditer(text, max(len(text) - 2000, 0))}
+    return next((label for group, label in _OUTCOME_MAP.items() if group in found), None)
 
 
 def extract_statutes(text: str) -> list[str]:
     """Extract statute references."""
     if not text:
         return []
-    pattern = r"§\s*(\d+\.\d+)"
-    matches = re.findall(pattern, text)
+    matches = _STATUTE_RE.findall(text)
     return list(dict.fromkeys(f"§ {m}" for m in matches))
 
 
 def classify_dwi(case_name: str, text: str) -> str | None:
     """Check if the case is DWI-related."""
-    combined = (case_name + " " + (text or "")[:5000]).lower()
-    dwi_signals = [
-        "dwi", "dui", "driving while intoxicated", "intoxication",
-        "blood alcohol", "49.04", "49.045", "49.07", "49.08",
-        "breathalyzer", "field sobriety",
-    ]
-    if any(s in combined for s in dwi_signals):
+    if _DWI_SIGNALS_RE.search(case_name) or _DWI_SIGNALS_RE.search(text or "", 0, 5000):
         return "dwi"
     return None
 
 
-def process_cap_cases(cases: list[dict], case_type_hint: str) -> list[dict]:
-    """Convert CAP case records to our schema."""
-    processed = []
-
-    for case in cases:
-        case_id = case.get("id", "")
-        case_name = case.get("name", "Unknown")
-        court = case.get("court", {})
-        court_slug = court.get("slug", "") if isinstance(court, dict) else ""
-        court_name = court.get("name", "") if isinstance(court, dict) else ""
-        date_filed = case.get("decision_date")
-        docket_number = case.get("docket_number", "")
-
-        citations = []
-        for c in case.get("citations", []):
-            if isinstance(c, dict):
-                citations.append(c.get("cite", str(c)))
-            else:
-                citations.append(str(c))
-
-        text = extract_opinion_text(case)
-        case_type = classify_dwi(case_name, text) or case_type_hint
-        outcome = extract_outcome(text)
-        statutes = extract_statutes(text or "")
-
-        record = {
-            "source": "cap",
-            "source_id": f"cap-{case_id}",
-            "case_name": case_name,
-            "court": court_slug,
-            "court_full_name": court_name,
-            "date_filed": date_filed,
-            "docket_number": docket_number,
-            "citations": citations,
-            "case_type": case_type,
-            "opinion_type": "majority",
-            "opinion_text": text[:500000] if text else None,
-            "summary": (text[:500] + "...") if text and len(text) > 500 else text,
-            "outcome": outcome,
-            "judges": [],
-            "statutes_cited": statutes,
-            "tags": [case_type] if case_type else [],
-            "metadata": json.dumps({
-                "cap_id": case_id,
-                "cap_url": case.get("url", ""),
-                "frontend_url": case.get("frontend_url", ""),
-            }),
-        }
-        processed.append(record)
-
-    return processed
-
-
-def insert_opinions(db_url: str, opinions: list[dict]) -> int:
-    """Insert opinions into the database, skipping duplicates."""
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-    inserted = 0
-
-    for op in opinions:
-        try:
-            cur.execute("""
-                INSERT INTO case_opinions
-                    (source, source_id, case_name, court, court_full_name,
-                     date_filed, docket_number, citations, case_type,
-                     opinion_type, opinion_text, summary, outcome,
-                     judges, statutes_cited, tags, metadata)
-                VALUES
-                    (%(source)s, %(source_id)s, %(case_name)s, %(court)s,
-                     %(court_full_name)s, %(date_filed)s, %(docket_number)s,
-                     %(citations)s, %(case_type)s, %(opinion_type)s,
-                     %(opinion_text)s, %(summary)s, %(outcome)s,
-                     %(judges)s, %(statutes_cited)s, %(tags)s, %(metadata)s)
-                ON CONFLICT (source_id) DO NOTHING
-            """, op)
-            if cur.rowcount > 0:
-                inserted += 1
-        except Exception as e:
-            print(f"  Error inserting {op.get('case_name', '?')}: {e}")
-            conn.rollback()
-            continue
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    return inserted
+def build_record(case: dict, detail: dict | None, case_type_hint: str) -> dict:
+    """Build one case_opinions row from a CAP search result and its full case."""
+    case_id = case.get("id", "")
+    case_name = case.get("name", "Unknown")
+    court = case.get("court", {})
+    court_slug = court.get("slug", "") if isinstance(court, dict) else ""
+    court_name = court.get("name", "") if isinstance(court, dict) else ""
+    date_filed = case.get("decision_date")
+    docket_number = case.get("docket_number", "")
+
+    citations = []
+    for c in case.get("citations", []):
+        if isinstance(c, dict):
+            citations.append(c.get("cite", str(c)))
+        else:
+            citations.append(str(c))
+
+    text = extract_opinion_text(detail or case)
+    case_type = classify_dwi(case_name, text) or case_type_hint
+    outcome = extract_outcome(text)
+    statutes = extract_statutes(text or "")
+
+    opinion_text, opinion_text_zst, summary = text_columns(text)
+
+    return {
+        "source": "cap",
+        "source_id": f"cap-{case_id}",
+        "case_name": case_name,
+        "court": court_slug,
+        "court_full_name": court_name,
+        "date_filed": date_filed,
+        "docket_number": docket_number,
+        "citations": citations,
+        "case_type": case_type,
+        "opinion_type": "majority",
+        "opinion_text": opinion_text,
+        "opinion_text_zst": opinion_text_zst,
+        "summary": summary,
+        "outcome": outcome,
+        "judges": [],
+        "statutes_cited": statutes,
+        "tags": [case_type] if case_type else [],
+        "metadata": dump_json({
+            "cap_id": case_id,
+            "cap_url": case.get("url", ""),
+            "frontend_url": case.get("frontend_url", ""),
+        }),
+    }
+
+
+def process_cap_cases(cases: dict[int, dict], case_type_hint: str) -> Iterator[dict]:
+    """Convert CAP search results (keyed by id) to our schema, hydrating full text.
+
+    Records are yielded as each case body arrives, so only one full
+    casebody is held at a time.
+    """
+    for case_id, detail in iter_case_details([cid for cid in cases if cid]):
+        yield build_record(cases[case_id], detail, case_type_hint)
+    if None in cases:
+        yield build_record(cases[None], None, case_type_hint)
 
 
 def main():
@@ -255,28 +275,21 @@ def main():
     print(f"Dry run: {args.dry_run}")
     print("=" * 60)
 
-    all_processed = []
+    # Dedupe on the cheap metadata so each case body is fetched only once
+    cases_by_id: dict[int, dict] = {}
 
     for term in DWI_SEARCH_TERMS:
         print(f"\nSearching: '{term}'")
-        cases = search_cases(
+        for case in search_cases(
             query=term,
             jurisdiction="tex",
             decision_date_min=args.after,
             max_pages=args.max_pages,
-        )
-        if cases:
-            processed = process_cap_cases(cases, "dwi")
-            all_processed.extend(processed)
-
-    seen_ids = set()
-    unique = []
-    for op in all_processed:
-        if op["source_id"] not in seen_ids:
-            seen_ids.add(op["source_id"])
-            unique.append(op)
-
-    print(f"\nTotal unique cases: {len(unique)}")
+        ):
+            cases_by_id.setdefault(case.get("id"), case)
+
+    print(f"\nTotal unique cases: {len(cases_by_id)}")
+    unique = list(process_cap_cases(cases_by_id, "dwi"))
 
     if args.dry_run:
         print("\nDRY RUN — not saving to database.")
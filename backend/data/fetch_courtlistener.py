@@ -21,18 +21,31 @@ Texas Courts of Interest:
 """
 
 import argparse
-import json
+import html as html_lib
 import os
 import re
 import sys
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from pathlib import Path
+from typing import Iterator
 
-import psycopg2
-import psycopg2.extras
 import requests
 from dotenv import load_dotenv
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # strip_html falls back to regexes
+    LexborHTMLParser = None
+
+try:
+    from diskcache import Cache
+except ImportError:  # details are fetched fresh every run
+    Cache = None
+
+from .db import dump_json, insert_opinions, text_columns
+from .http import TIMEOUT, RateLimiter, iter_results, load_json, make_session
+
 load_dotenv()
 
 API_BASE = "https://www.courtlistener.com/api/rest/v4"
@@ -61,6 +74,20 @@ PARKING_SEARCH_QUERIES = [
     "parking fine",
 ]
 
+SESSION = make_session()
+
+# Authenticated CourtListener accounts get 5,000 requests/hour; every
+# search page and detail fetch draws from this one limiter.
+API_LIMITER = RateLimiter(80, per=60)
+SEARCH_WORKERS = 4
+DETAIL_WORKERS = 8
+
+# Opinion details rarely change; reruns read them from disk instead of
+# spending the API budget on them again.
+DETAIL_CACHE_DIR = Path(__file__).resolve().parent.parent / ".cache" / "cl_details"
+DETAIL_CACHE_TTL = 30 * 24 * 3600
+DETAIL_CACHE = Cache(str(DETAIL_CACHE_DIR)) if Cache else None
+
 STATUTE_PATTERNS_DWI = [
     r"49\.04",
     r"49\.045",
@@ -70,6 +97,54 @@ STATUTE_PATTERNS_DWI = [
     r"49\.01",
 ]
 
+DWI_KEYWORDS = [
+    "dwi", "dui", "driving while intoxicated", "intoxication",
+    "blood alcohol", "bac", "breathalyzer", "field sobriety",
+    "implied consent", "intoxication manslaughter",
+    "intoxication assault",
+]
+
+PARKING_KEYWORDS = [
+    "parking violation", "parking ticket", "parking fine",
+    "handicap parking", "disabled parking",
+]
+
+# One pass per label instead of a search per pattern/keyword; matched
+# case-insensitively so the opinion text never has to be lowercased.
+_DWI_RE = re.compile(
+    "|".join([*STATUTE_PATTERNS_DWI, *map(re.escape, DWI_KEYWORDS)]), re.IGNORECASE,
+)
+_PARKING_RE = re.compile("|".join(map(re.escape, PARKING_KEYWORDS)), re.IGNORECASE)
+_STATUTE_RE = re.compile(
+    r"(?:Tex(?:as)?\.?\s*)?(?:Penal|Transp(?:ortation)?|Gov(?:ernment)?)\.?\s*Code\s*(?:Ann(?:otated)?\.?\s*)?§?\s*(\d+\.\d+)",
+    re.IGNORECASE,
+)
+# Most specific alternative first, so "reversed and remanded" isn't
+# swallowed by the bare "reverse"/"remand" branches.
+_OUTCOME_RE = re.compile(
+    r"(?P<rev_rem>reversed? and remand)"
+    r"|(?P<affirmed>affirm)"
+    r"|(?P<reversed>reverse)"
+    r"|(?P<remanded>remand)"
+    r"|(?P<dismissed>dismiss)"
+    r"|(?P<abated>abated)",
+    re.IGNORECASE,
+)
+# In priority order: the highest-ranked outcome mentioned anywhere in the
+# tail wins, not the first one to appear.
+_OUTCOME_MAP = {
+    "rev_rem": "reversed and remanded",
+    "affirmed": "affirmed",
+    "reversed": "reversed",
+    "remanded": "remanded",
+    "dismissed": "dismissed",
+    "abated": "abated",
+}
+_JUSTICE_RE = re.compile(r"(?:Chief\s+)?Justice\s+")
+_JUDGE_SPLIT_RE = re.compile(r"[,;]|and\s+")
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+
 
 def fetch_opinions(
     token: str,
@@ -77,13 +152,13 @@ def fetch_opinions(
     courts: list[str],
     after_date: str = "2005-01-01",
     max_pages: int = 100,
-) -> list[dict]:
-    """Fetch opinions from CourtListener search API."""
+) -> Iterator[dict]:
+    """Fetch opinions from CourtListener search API, yielding each result."""
     # v4 API uses fielded search in the q parameter
     court_clause = " OR ".join(f"court_id:{c}" for c in courts)
     full_query = f'({query}) AND ({court_clause}) AND dateFiled:[{after_date} TO *]'
 
-    all_results = []
+    total = 0
     url = f"{API_BASE}/search/"
 
     params = {
@@ -101,63 +176,94 @@ def fetch_opinions(
         page += 1
         print(f"  Fetching page {page} for query '{query}'...")
 
+        API_LIMITER.acquire()
         try:
-            resp = requests.get(url, params=params if page == 1 else None, headers=headers)
+            resp = SESSION.get(
+                url, params=params if page == 1 else None,
+                headers=headers, timeout=TIMEOUT, stream=True,
+            )
             resp.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            if resp.status_code == 429:
-                retry_after = int(resp.headers.get("Retry-After", 30))
-                print(f"  Rate limited. Waiting {retry_after}s...")
-                time.sleep(retry_after)
-                continue
+        except requests.exceptions.RequestException as e:
             print(f"  HTTP error: {e}")
             break
 
-        data = resp.json()
-        results = data.get("results", [])
-        all_results.extend(results)
-        print(f"  Got {len(results)} results (total so far: {len(all_results)})")
+        next_page = {}
+        count = 0
+        with resp:
+            for result in iter_results(resp, next_page):
+                count += 1
+                yield result
+        total += count
+        print(f"  Got {count} results (total so far: {total})")
 
-        url = data.get("next")
+        url = next_page.get("next")
         params = None
 
-        time.sleep(1.5)
 
-    return all_results
+def search_all(
+    token: str,
+    queries: list[str],
+    courts: list[str],
+    after_date: str,
+    max_pages: int,
+) -> dict[str, list[dict]]:
+    """Run fetch_opinions for several queries concurrently, keyed by query."""
+    def run(query: str) -> list[dict]:
+        return list(fetch_opinions(
+            token, query, courts, after_date=after_date, max_pages=max_pages,
+        ))
+
+    with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as ex:
+        return dict(zip(queries, ex.map(run, queries)))
 
 
 def fetch_opinion_detail(token: str, opinion_id: int) -> dict | None:
     """Fetch full opinion text for a single opinion."""
+    if DETAIL_CACHE is not None:
+        cached = DETAIL_CACHE.get(opinion_id)
+        if cached is not None:
+            return cached
+
     url = f"{API_BASE}/opinions/{opinion_id}/"
     headers = {"Authorization": f"Token {token}"}
 
+    API_LIMITER.acquire()
     try:
-        resp = requests.get(url, headers=headers)
+        resp = SESSION.get(url, headers=headers, timeout=TIMEOUT)
         resp.raise_for_status()
-        return resp.json()
+        detail = load_json(resp)
     except Exception as e:
         print(f"  Error fetching opinion {opinion_id}: {e}")
         return None
 
+    if DETAIL_CACHE is not None:
+        DETAIL_CACHE.set(opinion_id, detail, expire=DETAIL_CACHE_TTL)
+    return detail
+
+
+def iter_opinion_details(
+    token: str, opinion_ids: list[int],
+) -> Iterator[tuple[int, dict | None]]:
+    """Fetch full opinions concurrently, yielding (id, detail) as each lands.
+
+    Each detail carries several copies of the opinion text, so callers
+    should extract what they need and let it go rather than collect them.
+    """
+    opinion_ids = list(dict.fromkeys(opinion_ids))
+    print(f"  Fetching full text for {len(opinion_ids)} opinions...")
+    with ThreadPoolExecutor(max_workers=DETAIL_WORKERS) as ex:
+        futures = {ex.submit(fetch_opinion_detail, token, oid): oid for oid in opinion_ids}
+        for f in as_completed(futures):
+            yield futures.pop(f), f.result()
+
 
 def classify_case(case_name: str, text: str) -> str | None:
     """Classify a case as 'dwi' or 'parking_ticket' based on content."""
-    combined = (case_name + " " + (text or "")[:5000]).lower()
-
-    for pattern in STATUTE_PATTERNS_DWI:
-        if re.search(pattern, combined):
-            return "dwi"
+    text = text or ""
 
-    dwi_keywords = ["dwi", "dui", "driving while intoxicated", "intoxication",
-                     "blood alcohol", "bac", "breathalyzer", "field sobriety",
-                     "implied consent", "intoxication manslaughter",
-                     "intoxication assault"]
-    if any(kw in combined for kw in dwi_keywords):
+    if _DWI_RE.search(case_name) or _DWI_RE.search(text, 0, 5000):
         return "dwi"
-
-    parking_keywords = ["parking violation", "parking ticket", "parking fine",
-                        "handicap parking", "disabled parking"]
-    if any(kw in combined for kw in parking_keywords):
+    if _PARKING_RE.search(case_name) or _PARKING_RE.search(text, 0, 5000):
         return "parking_ticket"
 
     return None
@@ -167,27 +273,15 @@ def extract_outcome(text: str) -> str | None:
     """Try to extract the case outcome from opinion text."""
     if not text:
         return None
-    last_paragraphs = text[-2000:].lower()
-    outcomes = [
-        ("affirmed", ["affirm", "we affirm", "judgment is affirmed", "conviction is affirmed"]),
-        ("reversed", ["reverse", "we reverse", "judgment is reversed"]),
-        ("remanded", ["remand", "we remand"]),
-        ("reversed and remanded", ["reverse and remand", "reversed and remanded"]),
-        ("dismissed", ["dismiss", "we dismiss", "appeal is dismissed"]),
-        ("abated", ["abated", "appeal abated"]),
-    ]
-    for outcome, patterns in outcomes:
-        if any(p in last_paragraphs for p in patterns):
-            return outcome
-    return None
+    found = {m.lastgroup for m in _OUTCOME_RE.finditer(text, max(len(text) - 2000, 0))}
+    return next((label for group, label in _OUTCOME_MAP.items() if group in found), None)
 
 
 def extract_statutes(text: str) -> list[str]:
     """Extract Texas Penal Code statute references from opinion text."""
     if not text:
         return []
-    pattern = r"(?:Tex(?:as)?\.?\s*)?(?:Penal|Transp(?:ortation)?|Gov(?:ernment)?)\.?\s*Code\s*(?:Ann(?:otated)?\.?\s*)?§?\s*(\d+\.\d+)"
-    matches = re.findall(pattern, text, re.IGNORECASE)
+    matches = _STATUTE_RE.findall(text)
     seen = set()
     statutes = []
     for m in matches:
@@ -203,43 +297,92 @@ def extract_judges(result: dict) -> list[str]:
     judges_str = result.get("judge", "") or ""
     if not judges_str:
         return []
-    judges_str = re.sub(r"(?:Chief\s+)?Justice\s+", "", judges_str)
-    return [j.strip() for j in re.split(r"[,;]|and\s+", judges_str) if j.strip()]
-
-
-def insert_opinions(db_url: str, opinions: list[dict]) -> int:
-    """Insert opinions into the database, skipping duplicates."""
-    conn = psycopg2.connect(db_url)
-    cur = conn.cursor()
-
-    inserted = 0
-    for op in opinions:
-        try:
-            cur.execute("""
-                INSERT INTO case_opinions
-                    (source, source_id, case_name, court, court_full_name,
-                     date_filed, docket_number, citations, case_type,
-                     opinion_type, opinion_text, summary, outcome,
-                     judges, statutes_cited, tags, metadata)
-                VALUES
-                    (%(source)s, %(source_id)s, %(case_name)s, %(court)s,
-                     %(court_full_name)s, %(date_filed)s, %(docket_number)s,
-                     %(citations)s, %(case_type)s, %(opinion_type)s,
-                     %(opinion_text)s, %(summary)s, %(outcome)s,
-                     %(judges)s, %(statutes_cited)s, %(tags)s, %(metadata)s)
-                ON CONFLICT (source_id) DO NOTHING
-            """, op)
-            if cur.rowcount > 0:
-                inserted += 1
-        except Exception as e:
-            print(f"  Error inserting {op.get('case_name', '?')}: {e}")
-            conn.rollback()
-            continue
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    return inserted
+    judges_str = _JUSTICE_RE.sub("", judges_str)
+    return [j.strip() for j in _JUDGE_SPLIT_RE.split(judges_str) if j.strip()]
+
+
+def strip_html(html: str) -> str:
+    """Reduce opinion HTML to whitespace-normalized plain text."""
+    if LexborHTMLParser is not None:
+        text = LexborHTMLParser(html).text(separator=" ", strip=True)
+        return _WS_RE.sub(" ", text)
+    text = html_lib.unescape(_TAG_RE.sub(" ", html))
+    return _WS_RE.sub(" ", text).strip()
+
+
+def _opinion_id(result: dict) -> int | None:
+    return result.get("id") or result.get("cluster_id")
+
+
+def _source_id(result: dict) -> str:
+    opinion_id = _opinion_id(result)
+    if opinion_id:
+        return f"cl-{opinion_id}"
+    case_name = result.get("caseName", "") or result.get("case_name", "") or "Unknown"
+    date_filed = result.get("dateFiled") or result.get("date_filed")
+    return f"cl-{hash(case_name + str(date_filed))}"
+
+
+def _detail_text(detail: dict | None, snippet: str) -> str:
+    if not detail:
+        return snippet
+    text = (
+        detail.get("plain_text")
+        or detail.get("html_with_citations")
+        or detail.get("html")
+        or snippet
+    )
+    if text and text.startswith("<"):
+        text = strip_html(text)
+    return text
+
+
+def build_record(r: dict, text: str, case_type_hint: str) -> dict:
+    """Build one case_opinions row from a search result and its text."""
+    case_name = r.get("caseName", "") or r.get("case_name", "") or "Unknown"
+    court = r.get("court", "") or r.get("court_id", "") or ""
+    court_full = r.get("court_citation_string", "") or ""
+    date_filed = r.get("dateFiled") or r.get("date_filed")
+    docket_number = r.get("docketNumber") or r.get("docket_number") or ""
+    opinion_id = _opinion_id(r)
+
+    case_type = classify_case(case_name, text) or case_type_hint
+    outcome = extract_outcome(text)
+    statutes = extract_statutes(text)
+    judges = extract_judges(r)
+
+    citations = []
+    if r.get("citation"):
+        citations = r["citation"] if isinstance(r["citation"], list) else [r["citation"]]
+    elif r.get("citations"):
+        citations = [c.get("cite", str(c)) for c in r["citations"]] if isinstance(r["citations"], list) else []
+
+    opinion_text, opinion_text_zst, summary = text_columns(text)
+
+    return {
+        "source": "courtlistener",
+        "source_id": _source_id(r),
+        "case_name": case_name,
+        "court": court,
+        "court_full_name": court_full,
+        "date_filed": date_filed,
+        "docket_number": docket_number,
+        "citations": citations,
+        "case_type": case_type,
+        "opinion_type": r.get("type", "majority"),
+        "opinion_text": opinion_text,
+        "opinion_text_zst": opinion_text_zst,
+        "summary": summary,
+        "outcome": outcome,
+        "judges": judges,
+        "statutes_cited": statutes,
+        "tags": [case_type] if case_type else [],
+        "metadata": dump_json({
+            "courtlistener_url": f"https://www.courtlistener.com/opinion/{opinion_id}/",
+            "court_id": court,
+            "date_filed": date_filed,
+        }),
+    }
 
 
 def process_search_results(
@@ -247,75 +390,39 @@ def process_search_results(
     results: list[dict],
     case_type_hint: str,
     fetch_full_text: bool = True,
-) -> list[dict]:
-    """Convert CourtListener search results to our schema format."""
-    processed = []
-
-    for i, r in enumerate(results):
-        case_name = r.get("caseName", "") or r.get("case_name", "") or "Unknown"
-        court = r.get("court", "") or r.get("court_id", "") or ""
-        court_full = r.get("court_citation_string", "") or ""
-        date_filed = r.get("dateFiled") or r.get("date_filed")
-        docket_number = r.get("docketNumber") or r.get("docket_number") or ""
-
-        snippet = r.get("snippet", "") or ""
-        text = snippet
-
-        opinion_id = r.get("id") or r.get("cluster_id")
-
-        if fetch_full_text and opinion_id:
-            if i > 0 and i % 10 == 0:
-                print(f"  Fetching full text... ({i}/{len(results)})")
-                time.sleep(1)
-            detail = fetch_opinion_detail(token, opinion_id)
-            if detail:
-                text = (
-                    detail.get("plain_text")
-                    or detail.get("html_with_citations")
-                    or detail.get("html")
-                    or snippet
-                )
-                if text and text.startswith("<"):
-                    text = re.sub(r"<[^>]+>", " ", text)
-                    text = re.sub(r"\s+", " ", text).strip()
-
-        case_type = classify_case(case_name, text) or case_type_hint
-        outcome = extract_outcome(text)
-        statutes = extract_statutes(text)
-        judges = extract_judges(r)
-
-        citations = []
-        if r.get("citation"):
-            citations = r["citation"] if isinstance(r["citation"], list) else [r["citation"]]
-        elif r.get("citations"):
-            citations = [c.get("cite", str(c)) for c in r["citations"]] if isinstance(r["citations"], list) else []
-
-        record = {
-            "source": "courtlistener",
-            "source_id": f"cl-{opinion_id}" if opinion_id else f"cl-{hash(case_name + str(date_filed))}",
-            "case_name": case_name,
-            "court": court,
-            "court_full_name": court_full,
-            "date_filed": date_filed,
-            "docket_number": docket_number,
-            "citations": citations,
-            "case_type": case_type,
-            "opinion_type": r.get("type", "majority"),
-            "opinion_text": text[:500000] if text else None,
-            "summary": (text[:500] + "...") if text and len(text) > 500 else text,
-            "outcome": outcome,
-            "judges": judges,
-            "statutes_cited": statutes,
-            "tags": [case_type] if case_type else [],
-            "metadata": json.dumps({
-                "courtlistener_url": f"https://www.courtlistener.com/opinion/{opinion_id}/",
-                "court_id": court,
-                "date_filed": date_filed,
-            }),
-        }
-        processed.append(record)
-
-    return processed
+) -> Iterator[dict]:
+    """Convert CourtListener search results to our schema format.
+
+    Records are yielded as each opinion's full text arrives, so only one
+    detail response is held at a time.
+    """
+    if not fetch_full_text:
+        for r in results:
+            yield build_record(r, r.get("snippet", "") or "", case_type_hint)
+        return
+
+    by_id: dict[int, list[dict]] = {}
+    for r in results:
+        opinion_id = _opinion_id(r)
+        if opinion_id:
+            by_id.setdefault(opinion_id, []).append(r)
+        else:
+            yield build_record(r, r.get("snippet", "") or "", case_type_hint)
+
+    for opinion_id, detail in iter_opinion_details(token, list(by_id)):
+        for r in by_id.pop(opinion_id):
+            text = _detail_text(detail, r.get("snippet", "") or "")
+            yield build_record(r, text, case_type_hint)
+
+
+def unseen_results(results: list[dict], seen: dict[str, dict]) -> list[dict]:
+    """Drop results whose source_id is already in `seen` (or repeats in results)."""
+    fresh = {}
+    for r in results:
+        source_id = _source_id(r)
+        if source_id not in seen:
+            fresh.setdefault(source_id, r)
+    return list(fresh.values())
 
 
 def main():
@@ -348,45 +455,46 @@ def main():
     print(f"Dry run: {args.dry_run}")
     print("=" * 60)
 
-    all_processed = []
+    unique_by_id: dict[str, dict] = {}
+
+    print("\n--- Searching ---")
+    search_results = search_all(
+        token, DWI_SEARCH_QUERIES + PARKING_SEARCH_QUERIES, TEXAS_CRIMINAL_COURTS,
+        after_date=args.after, max_pages=args.max_pages,
+    )
 
+    # Queries overlap heavily ("DWI" vs "driving while intoxicated"), so
+    # opinions an earlier query already produced are skipped before their
+    # full text is fetched or processed again.
     # --- DWI cases ---
     print("\n--- Fetching DWI cases ---")
     for query in DWI_SEARCH_QUERIES:
-        results = fetch_opinions(
-            token, query, TEXAS_CRIMINAL_COURTS,
-            after_date=args.after, max_pages=args.max_pages,
-        )
-        if results:
+        results = search_results[query]
+        fresh = unseen_results(results, unique_by_id)
+        if fresh:
             processed = process_search_results(
-                token, results, "dwi",
+                token, fresh, "dwi",
                 fetch_full_text=not args.no_full_text,
             )
-            all_processed.extend(processed)
+            for op in processed:
+                unique_by_id[op["source_id"]] = op
         print(f"  '{query}': {len(results)} results")
 
     # --- Parking cases (will likely be sparse) ---
     print("\n--- Fetching parking violation cases ---")
     for query in PARKING_SEARCH_QUERIES:
-        results = fetch_opinions(
-            token, query, TEXAS_CRIMINAL_COURTS,
-            after_date=args.after, max_pages=args.max_pages,
-        )
-        if results:
+        results = search_results[query]
+        fresh = unseen_results(results, unique_by_id)
+        if fresh:
             processed = process_search_results(
-                token, results, "parking_ticket",
+                token, fresh, "parking_ticket",
                 fetch_full_text=not args.no_full_text,
             )
-            all_processed.extend(processed)
+            for op in processed:
+                unique_by_id[op["source_id"]] = op
         print(f"  '{query}': {len(results)} results")
 
-    # Deduplicate by source_id
-    seen_ids = set()
-    unique = []
-    for op in all_processed:
-        if op["source_id"] not in seen_ids:
-            seen_ids.add(op["source_id"])
-            unique.append(op)
+    unique = list(unique_by_id.values())
 
     print(f"\nTotal unique opinions: {len(unique)}")
     dwi_count = sum(1 for o in unique if o["case_type"] == "dwi")
@@ -0,0 +1,94 @@
+"""
+HTTP session shared by the fetch scripts.
+"""
+
+import threading
+import time
+from typing import Iterator
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import ijson
+except ImportError:  # fall back to parsing whole pages with load_json()
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# (connect, read) seconds
+TIMEOUT = (5, 30)
+
+
+def make_session(headers: dict | None = None) -> requests.Session:
+    """Build a keep-alive session that retries 429/5xx with backoff.
+
+    Retry-After is honored on 429/503, so callers don't need their own
+    rate-limit handling; once retries run out the last response is
+    returned and raise_for_status() surfaces it as usual.
+    """
+    retry = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def load_json(resp: requests.Response):
+    """Decode a JSON response body, with orjson when installed."""
+    if orjson is not None:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+
+def iter_results(resp: requests.Response, page: dict) -> Iterator[dict]:
+    """Yield the "results" items of a paginated API response one at a time.
+
+    With ijson installed the body is parsed as it streams in (request it
+    with stream=True), so a page of full opinions is never held in memory
+    at once. page["next"] is filled in by the time the generator is done.
+    """
+    if ijson is None:
+        data = load_json(resp)
+        page["next"] = data.get("next")
+        yield from data.get("results", [])
+        return
+
+    def events():
+        for prefix, event, value in ijson.parse(resp.raw, use_float=True):
+            if prefix == "next" and event in ("string", "null"):
+                page["next"] = value
+            yield prefix, event, value
+
+    resp.raw.decode_content = True
+    yield from ijson.items(events(), "results.item")
+
+
+class RateLimiter:
+    """Spaces calls evenly at `rate` per `per` seconds across threads."""
+
+    def __init__(self, rate: float, per: float = 1.0):
+        self._interval = per / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(self._next, now) + self._interval
+        if wait > 0:
+            time.sleep(wait)
@@ -22,9 +22,9 @@ CREATE TABLE IF NOT EXISTS intake_sessions (
     client_info     JSONB DEFAULT '{}'
 );
 
-CREATE INDEX IF NOT EXISTS idx_sessions_case_type ON intake_sessions(case_type);
-CREATE INDEX IF NOT EXISTS idx_sessions_recommendation ON intake_sessions(recommendation);
-CREATE INDEX IF NOT EXISTS idx_sessions_created ON intake_sessions(created_at DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_case_type ON intake_sessions(case_type);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_recommendation ON intake_sessions(recommendation);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_created ON intake_sessions(created_at DESC);
 
 -- ============================================================
 -- CASE OPINIONS
@@ -43,7 +43,8 @@ CREATE TABLE IF NOT EXISTS case_opinions (
     citations       TEXT[],                         -- array of citation strings
     case_type       VARCHAR(50),                    -- 'dwi', 'parking_ticket', etc.
     opinion_type    VARCHAR(50),                    -- 'majority', 'concurrence', 'dissent'
-    opinion_text    TEXT,                           -- full text of the opinion
+    opinion_text    TEXT,                           -- opinion text, capped at 500KB
+    opinion_text_zst BYTEA,                         -- zstd full text when opinion_text was capped
     summary         TEXT,                           -- AI or human-written summary
     outcome         VARCHAR(300),                   -- 'affirmed', 'reversed', 'remanded'
     judges          TEXT[],
@@ -56,14 +57,17 @@ CREATE TABLE IF NOT EXISTS case_opinions (
     search_vector   tsvector
 );
 
-CREATE INDEX IF NOT EXISTS idx_opinions_case_type ON case_opinions(case_type);
-CREATE INDEX IF NOT EXISTS idx_opinions_court ON case_opinions(court);
-CREATE INDEX IF NOT EXISTS idx_opinions_date ON case_opinions(date_filed DESC);
-CREATE INDEX IF NOT EXISTS idx_opinions_source ON case_opinions(source, source_id);
-CREATE INDEX IF NOT EXISTS idx_opinions_outcome ON case_opinions(outcome);
-CREATE INDEX IF NOT EXISTS idx_opinions_search ON case_opinions USING gin(search_vector);
-CREATE INDEX IF NOT EXISTS idx_opinions_statutes ON case_opinions USING gin(statutes_cited);
-CREATE INDEX IF NOT EXISTS idx_opinions_tags ON case_opinions USING gin(tags);
+-- Added after the initial release; brings older databases up to date
+ALTER TABLE case_opinions ADD COLUMN IF NOT EXISTS opinion_text_zst BYTEA;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_case_type ON case_opinions(case_type);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_court ON case_opinions(court);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_date ON case_opinions(date_filed DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_source ON case_opinions(source, source_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_outcome ON case_opinions(outcome);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_search ON case_opinions USING gin(search_vector);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_statutes ON case_opinions USING gin(statutes_cited);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_opinions_tags ON case_opinions USING gin(tags);
 
 -- Auto-update search_vector on insert/update
 CREATE OR REPLACE FUNCTION update_opinion_search_vector()
@@ -101,8 +105,8 @@ CREATE TABLE IF NOT EXISTS case_embeddings (
     UNIQUE(opinion_id, model, chunk_index)
 );
 
-CREATE INDEX IF NOT EXISTS idx_embeddings_opinion ON case_embeddings(opinion_id);
-CREATE INDEX IF NOT EXISTS idx_embeddings_vector ON case_embeddings
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_embeddings_opinion ON case_embeddings(opinion_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_embeddings_vector ON case_embeddings
     USING ivfflat (embedding vector_cosine_ops)
     WITH (lists = 100);
 
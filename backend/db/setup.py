@@ -7,16 +7,80 @@ Usage:
 """
 
 import os
+import re
 import sys
 from pathlib import Path
 
 import psycopg2
+from psycopg2 import sql
 from dotenv import load_dotenv
 
 load_dotenv()
 
 SCHEMA_FILE = Path(__file__).parent / "schema.sql"
 
+# Tokens that can hide a ';' which doesn't end the statement
+_SQL_TOKEN_RE = re.compile(r"--[^\n]*|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|(\$\w*\$)|;")
+_CREATE_INDEX_RE = re.compile(
+    r"^CREATE\s+(?:UNIQUE\s+)?INDEX\s+(?:CONCURRENTLY\s+)?(?:IF\s+NOT\s+EXISTS\s+)?(\w+)",
+    re.IGNORECASE,
+)
+
+
+def split_statements(script: str) -> list[str]:
+    """Split a SQL script on top-level semicolons.
+
+    Semicolons inside comments, quoted strings and dollar-quoted function
+    bodies are left alone.
+    """
+    statements = []
+    start = pos = 0
+    while m := _SQL_TOKEN_RE.search(script, pos):
+        pos = m.end()
+        if m.group(1):
+            # Skip to the matching closing dollar-quote tag
+            end = script.find(m.group(1), pos)
+            pos = len(script) if end == -1 else end + len(m.group(1))
+        elif m.group() == ";":
+            statements.append(script[start:m.start()])
+            start = pos
+    statements.append(script[start:])
+    # Drop leading comment lines so each statement starts with its SQL
+    statements = [re.sub(r"^(?:\s*--[^\n]*)+", "", stmt).strip() for stmt in statements]
+    return [stmt for stmt in statements if stmt]
+
+
+def drop_invalid_indexes(cur, statements: list[str]) -> None:
+    """Drop indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY.
+
+    IF NOT EXISTS would otherwise skip them forever; dropping them lets the
+    schema rebuild them below. Only indexes the schema creates are touched,
+    and not while another session is still building them.
+    """
+    names = [
+        m.group(1) for stmt in statements if (m := _CREATE_INDEX_RE.match(stmt))
+    ]
+    cur.execute("""
+        SELECT n.nspname, c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE NOT i.indisvalid
+        AND n.nspname = 'public'
+        AND c.relname = ANY(%s)
+        AND NOT EXISTS (
+            SELECT 1 FROM pg_stat_progress_create_index p
+            WHERE p.index_relid = i.indexrelid
+        );
+    """, (names,))
+    for schema, index in cur.fetchall():
+        print(f"  Dropping invalid index {index} (will be rebuilt)")
+        cur.execute(
+            sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(
+                sql.Identifier(schema, index)
+            )
+        )
+
 
 def run_schema(database_url: str) -> None:
     print(f"Connecting to database...")
@@ -26,9 +90,19 @@ def run_schema(database_url: str) -> None:
 
     schema_sql = SCHEMA_FILE.read_text()
 
+    # One statement at a time so a single failure doesn't hide the rest,
+    # and so CREATE INDEX CONCURRENTLY runs outside a transaction block.
     print("Running schema...")
-    cur.execute(schema_sql)
-
+    statements = split_statements(schema_sql)
+    drop_invalid_indexes(cur, statements)
+    failed = 0
+    for stmt in statements:
+        try:
+            cur.execute(stmt)
+        except psycopg2.Error as e:
+            failed += 1
+            print(f"  Failed: {stmt.splitlines()[0]}")
+            print(f"    {e.pgerror or e}".rstrip())
     cur.execute("""
         SELECT table_name
         FROM information_schema.tables
@@ -50,6 +124,10 @@ def run_schema(database_url: str) -> None:
 
     cur.close()
     conn.close()
+
+    if failed:
+        print(f"ERROR: {failed} statement(s) failed; see above.")
+        sys.exit(1)
     print("Done. Database is ready.")
 
 
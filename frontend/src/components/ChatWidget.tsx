@@ -11,6 +11,11 @@ const API_BASE = import.meta.env.VITE_API_URL
   ? `${import.meta.env.VITE_API_URL}/api/chat`
   : "/api/chat";
 
+// Batched reports can take a while; /report answers 202 until they land.
+// Polling stops after half an hour (REPORT_POLL_MAX_ATTEMPTS polls).
+const REPORT_POLL_MS = 15000;
+const REPORT_POLL_MAX_ATTEMPTS = 120;
+
 export function ChatWidget() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState("");
@@ -23,6 +28,17 @@ export function ChatWidget() {
 
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
+  // One polling chain at a time; bumping the generation orphans the old one
+  const reportTimerRef = useRef<number | undefined>(undefined);
+  const reportPollRef = useRef(0);
+
+  const stopReportPolling = useCallback(() => {
+    window.clearTimeout(reportTimerRef.current);
+    reportTimerRef.current = undefined;
+    reportPollRef.current += 1;
+  }, []);
+
+  useEffect(() => stopReportPolling, [sessionId, stopReportPolling]);
 
   const scrollToBottom = useCallback(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -87,14 +103,26 @@ export function ChatWidget() {
     }
   };
 
-  const fetchReport = async () => {
+  const fetchReport = async (attempt = 0) => {
     if (!sessionId) return;
+    if (attempt === 0) stopReportPolling();
+    const poll = reportPollRef.current;
     try {
       const res = await fetch(`${API_BASE}/report`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ session_id: sessionId }),
       });
+      if (poll !== reportPollRef.current) return;
+      if (res.status === 202) {
+        if (attempt + 1 < REPORT_POLL_MAX_ATTEMPTS) {
+          reportTimerRef.current = window.setTimeout(
+            () => fetchReport(attempt + 1),
+            REPORT_POLL_MS,
+          );
+        }
+        return;
+      }
       if (res.ok) {
         const data: IntakeReport = await res.json();
         setReport(data);